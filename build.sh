@@ -6,6 +6,6 @@ pip install --upgrade pip
 pip install -r requirements.txt
 
 echo "🌱 Running initial database seed..."
-python scripts/seed.py || echo "⚠️ Seed script failed or already seeded. Continuing build."
+python -m scripts.seed || echo "⚠️ Seed script failed or already seeded. Continuing build."
 
 echo "✅ Build complete."
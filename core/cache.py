@@ -0,0 +1,218 @@
+import time
+from functools import wraps
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi_cache import FastAPICache, default_key_builder
+from fastapi_cache.coder import Coder
+from fastapi_cache.decorator import cache
+from starlette.responses import Response
+
+from core import generation
+from core.streaming import streamed
+
+# Tag-based invalidation for the fastapi-cache response cache.
+#
+# Every cached endpoint declares the tags its data depends on. The current
+# version of each tag is part of the cache key, so invalidating a tag (giving
+# it a new version) makes every entry that depends on it unreachable without
+# touching unrelated entries. Unreachable entries age out through their TTL.
+# There is no sector tag: no cached endpoint filters by sector, and the
+# per-sector views are national, so they depend on GLOBAL.
+GLOBAL = "global"
+# Tag versions must outlive any cached entry that embeds them
+TAG_VERSION_TTL = 24 * 60 * 60
+
+
+def region_tag(region) -> str:
+    return f"region:{region}"
+
+
+def user_tag(user_id) -> str:
+    return f"user:{user_id}"
+
+
+def regions_tags(kwargs: dict) -> list:
+    # Entries filtered to a list of regions only depend on those regions,
+    # unfiltered (national) entries depend on everything
+    regions = kwargs.get("regions")
+    if not regions:
+        return [GLOBAL]
+    if isinstance(regions, str):
+        regions = regions.split(",")
+    return [region_tag(region) for region in regions]
+
+
+def user_tags(kwargs: dict) -> list:
+    return [user_tag(kwargs["user_id"])]
+
+
+def _tag_key(tag: str) -> str:
+    return f"{FastAPICache.get_prefix()}:tag:{tag}"
+
+
+async def _tag_versions(tags) -> list:
+    backend = FastAPICache.get_backend()
+    versions = []
+    for tag in tags:
+        version = await backend.get(_tag_key(tag))
+        if version is None:
+            # Never fall back to a fixed default: if the version was evicted,
+            # entries built on it must not become reachable again
+            version = str(time.time_ns()).encode()
+            await backend.set(_tag_key(tag), version, TAG_VERSION_TTL)
+        versions.append(version.decode() if isinstance(version, bytes) else version)
+    return versions
+
+
+async def invalidate(*tags):
+    backend = FastAPICache.get_backend()
+    version = str(time.time_ns()).encode()
+    for tag in set(tags):
+        await backend.set(_tag_key(tag), version, TAG_VERSION_TTL)
+
+
+def tagged_key_builder(tags):
+    async def key_builder(
+        func, namespace="", *, request=None, response=None, args=(), kwargs=None
+    ):
+        kwargs = kwargs or {}
+        entry_tags = tags(kwargs) if callable(tags) else list(tags)
+        versions = await _tag_versions(entry_tags)
+        # The endpoint name in the key lets evictions be counted per endpoint
+        key = default_key_builder(
+            func,
+            f"{namespace}:{func.__name__}",
+            request=request,
+            response=response,
+            args=args,
+            kwargs=kwargs,
+        )
+        return f"{key}:{'.'.join(versions)}"
+
+    return key_builder
+
+
+# Parameters fastapi-cache injects into the signature of cached endpoints
+_INJECTED = ("__fastapi_cache_request", "__fastapi_cache_response")
+# Headers of the final response, not to be copied from fastapi-cache's
+_OWN_HEADERS = {"content-length", "content-type", "etag"}
+# Cached entries are "<ETag>\n<JSON body>"; the ETag is a generation tag
+# (W/"g<n>", see core/generation.py) and JSON from orjson has no newline
+_ETAG_PREFIX = b'W/"g'
+
+
+def _orjson_default(value):
+    # Types orjson does not know: pydantic models, Decimal, ObjectId, ...
+    try:
+        return jsonable_encoder(value)
+    except ValueError:
+        return str(value)
+
+
+def _split_etag(value: bytes):
+    if value.startswith(_ETAG_PREFIX):
+        tag, _, body = value.partition(b"\n")
+        return tag.decode(), body
+    return None, value
+
+
+class ResponseBytesCoder(Coder):
+    """Stores the final JSON body, encoded once with orjson, together with
+    the ETag it was sent with, and answers hits with those bytes as they
+    are: no decoding, no jsonable_encoder and no second serialization by
+    FastAPI."""
+
+    @classmethod
+    def encode(cls, value) -> bytes:
+        if isinstance(value, Response):
+            tag = value.headers.get("etag")
+            return f"{tag}\n".encode() + value.body if tag else value.body
+        return orjson.dumps(
+            value,
+            default=_orjson_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+        )
+
+    @classmethod
+    def decode(cls, value: bytes):
+        return orjson.loads(_split_etag(value)[1])
+
+    @classmethod
+    def decode_as_type(cls, value: bytes, *, type_=None) -> Response:
+        tag, body = _split_etag(value)
+        return Response(
+            content=body,
+            media_type="application/json",
+            headers={"ETag": tag} if tag else None,
+        )
+
+
+def cached(expire: int, tags=(GLOBAL,)):
+    """fastapi-cache's @cache, keyed on the versions of the given tags, with
+    the data generation (core/generation.py) the body was built at as ETag.
+
+    `tags` is either a sequence of tag names or a callable receiving the
+    endpoint's keyword arguments and returning them. Streamed (NDJSON)
+    responses are never cached.
+    """
+
+    def wrapper(func):
+        @wraps(func)
+        async def encoded(*args, **kwargs):
+            # Misses send the same orjson bytes that get cached, instead of
+            # FastAPI serializing the result a second time. The generation is
+            # read first, so the body is at least as new as its ETag says
+            etag = generation.etag(await generation.current())
+            result = await func(*args, **kwargs)
+            if isinstance(result, Response):
+                return result
+            return Response(
+                content=ResponseBytesCoder.encode(result),
+                media_type="application/json",
+                headers={"ETag": etag},
+            )
+
+        cached_func = cache(
+            expire=expire,
+            key_builder=tagged_key_builder(tags),
+            coder=ResponseBytesCoder,
+        )(encoded)
+
+        @wraps(cached_func)
+        async def inner(*args, **kwargs):
+            if streamed(kwargs):
+                for name in _INJECTED:
+                    kwargs.pop(name, None)
+                return await func(*args, **kwargs)
+            # The ETag is the data generation a body was built at. A client
+            # holding the current generation gets 304 before any key building,
+            # cache lookup, aggregation or serialization
+            request = kwargs.get("__fastapi_cache_request")
+            sub_response = kwargs.get("__fastapi_cache_response")
+            if_none_match = request.headers.get("if-none-match") if request else None
+            current = generation.etag(await generation.current())
+            if generation.matches(if_none_match, current):
+                return Response(status_code=304, headers={"ETag": current})
+
+            result = await cached_func(*args, **kwargs)
+            if not isinstance(result, Response) or result is sub_response:
+                return result
+            # An entry built at an older generation (one this process's cache
+            # could not drop, e.g. after another worker's write or a rebuild)
+            # keeps its own ETag, so it never passes for current data
+            etag = result.headers.get("etag")
+            if etag and generation.matches(if_none_match, etag):
+                return Response(status_code=304, headers={"ETag": etag})
+            # FastAPI sends a returned Response as it is, so the cache headers
+            # fastapi-cache set on the injected response are copied onto it
+            if sub_response is not None:
+                for name, value in sub_response.headers.items():
+                    if name not in _OWN_HEADERS:
+                        result.headers[name] = value
+            return result
+
+        return inner
+
+    return wrapper
+
@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi_cache import Backend
+
+from core.metrics import CACHE_EVICTIONS, cache_endpoint
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Response cache configuration, read by the lifespan hook in main.py:
+#   CACHE_BACKEND      memory (default, per worker) | sqlite | redis
+#   CACHE_NAMESPACE    prefix of every cache key, lets several deployments
+#                      share one Redis database
+#   CACHE_MAX_ENTRIES  entry bound for the memory and sqlite backends
+#   CACHE_PATH         database file of the sqlite backend
+#   CACHE_URL          Redis URL of the redis backend
+#   CACHE_REDIS_MAXMEMORY  optional, e.g. "256mb": applied to the Redis server
+#                      together with the allkeys-lru policy
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_NAMESPACE = os.getenv("CACHE_NAMESPACE", "fastapi-cache")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_PATH = os.getenv("CACHE_PATH", "ghg-scout-cache.sqlite3")
+CACHE_URL = os.getenv("CACHE_URL", "redis://localhost:6379/0")
+CACHE_REDIS_MAXMEMORY = os.getenv("CACHE_REDIS_MAXMEMORY")
+
+
+def _ttl(expires_at: float, now: float) -> int:
+    # -1 for entries without expiry, like Redis' TTL
+    return -1 if expires_at == float("inf") else int(expires_at - now)
+
+
+class MemoryBackend(Backend):
+    """Size-bounded in-process LRU backend.
+
+    fastapi-cache's InMemoryBackend only drops expired entries when they are
+    read again; with versioned keys most stale entries never are, so this
+    backend caps the entry count and evicts least recently used entries.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._store = OrderedDict()  # key -> (expires_at, value)
+
+    def _get(self, key: str):
+        entry = self._store.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            del self._store[key]
+            return None
+        self._store.move_to_end(key)
+        return entry
+
+    async def get_with_ttl(self, key: str) -> Tuple[int, Optional[bytes]]:
+        entry = self._get(key)
+        if entry is None:
+            return 0, None
+        return _ttl(entry[0], time.time()), entry[1]
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._get(key)
+        return entry[1] if entry else None
+
+    async def set(self, key: str, value: bytes, expire: Optional[int] = None) -> None:
+        expires_at = time.time() + expire if expire else float("inf")
+        self._store[key] = (expires_at, value)
+        self._store.move_to_end(key)
+        while len(self._store) > self.max_entries:
+            evicted, _ = self._store.popitem(last=False)
+            self.evictions += 1
+            CACHE_EVICTIONS.labels(cache_endpoint(evicted)).inc()
+
+    async def clear(self, namespace: Optional[str] = None, key: Optional[str] = None) -> int:
+        if namespace:
+            keys = [k for k in self._store if k.startswith(namespace)]
+        else:
+            keys = [key] if key in self._store else []
+        for k in keys:
+            del self._store[k]
+        return len(keys)
+
+
+class SQLiteBackend(Backend):
+    """Cache shared by every worker on one host through a SQLite file.
+
+    A stand-in for Redis in tests and single-machine deployments. Queries run
+    in the default thread pool with one connection per thread; the oldest
+    entries are evicted once the table grows past max_entries.
+    """
+
+    PRUNE_EVERY = 100  # sets between size checks
+
+    def __init__(self, path: str, max_entries: int = 10000):
+        self.path = path
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._sets = 0
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY, value BLOB NOT NULL,"
+                " expires_at REAL NOT NULL, stored_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS cache_stored_at ON cache (stored_at)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def _get_with_ttl(self, key: str):
+        row = (
+            self._connect()
+            .execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,))
+            .fetchone()
+        )
+        now = time.time()
+        if row is None or row[1] <= now:
+            return 0, None
+        return _ttl(row[1], now), row[0]
+
+    def _set(self, key: str, value: bytes, expire: Optional[int]):
+        now = time.time()
+        expires_at = now + expire if expire else float("inf")
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at, stored_at)"
+            " VALUES (?, ?, ?, ?)",
+            (key, value, expires_at, now),
+        )
+        self._sets += 1
+        if self._sets % self.PRUNE_EVERY == 0:
+            self._prune(conn, now)
+
+    def _prune(self, conn: sqlite3.Connection, now: float):
+        conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+        (count,) = conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            evicted = [
+                key
+                for (key,) in conn.execute(
+                    "SELECT key FROM cache ORDER BY stored_at LIMIT ?", (excess,)
+                )
+            ]
+            conn.executemany("DELETE FROM cache WHERE key = ?", [(k,) for k in evicted])
+            self.evictions += len(evicted)
+            for key in evicted:
+                CACHE_EVICTIONS.labels(cache_endpoint(key)).inc()
+
+    def _clear(self, namespace: Optional[str], key: Optional[str]) -> int:
+        conn = self._connect()
+        if namespace:
+            pattern = namespace.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            cursor = conn.execute(
+                "DELETE FROM cache WHERE key LIKE ? ESCAPE '\\'", (pattern + "%",)
+            )
+        elif key:
+            cursor = conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+        else:
+            return 0
+        return cursor.rowcount
+
+    async def get_with_ttl(self, key: str) -> Tuple[int, Optional[bytes]]:
+        return await asyncio.to_thread(self._get_with_ttl, key)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return (await self.get_with_ttl(key))[1]
+
+    async def set(self, key: str, value: bytes, expire: Optional[int] = None) -> None:
+        await asyncio.to_thread(self._set, key, value, expire)
+
+    async def clear(self, namespace: Optional[str] = None, key: Optional[str] = None) -> int:
+        return await asyncio.to_thread(self._clear, namespace, key)
+
+
+async def _redis_backend() -> Backend:
+    # Optional dependency: only imported when the redis backend is selected
+    from fastapi_cache.backends.redis import RedisBackend
+    from redis.asyncio import Redis
+    from redis.exceptions import ResponseError
+
+    redis = Redis.from_url(CACHE_URL)
+    if CACHE_REDIS_MAXMEMORY:
+        try:
+            await redis.config_set("maxmemory", CACHE_REDIS_MAXMEMORY)
+            await redis.config_set("maxmemory-policy", "allkeys-lru")
+        except ResponseError as e:
+            # Managed Redis services often disable CONFIG
+            logger.warning(f"Could not apply Redis eviction settings: {e}")
+    return RedisBackend(redis)
+
+
+async def backend_from_env() -> Backend:
+    if CACHE_BACKEND == "memory":
+        return MemoryBackend(CACHE_MAX_ENTRIES)
+    if CACHE_BACKEND == "sqlite":
+        return SQLiteBackend(CACHE_PATH, CACHE_MAX_ENTRIES)
+    if CACHE_BACKEND == "redis":
+        return await _redis_backend()
+    raise ValueError(f"Unknown CACHE_BACKEND: {CACHE_BACKEND!r}")
@@ -2,8 +2,15 @@ import os
 from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
 
+from core import slow_queries
+from core.metrics import MongoCommandListener
+
 load_dotenv()
 
 MONGO_URI = os.getenv("MONGO_URI")
-client = AsyncIOMotorClient(MONGO_URI)
-db = client.ghg_scout
+MONGO_DB = os.getenv("MONGO_DB", "ghg_scout")
+# Command timings for /metrics (core/metrics.py) and the slow-query log
+client = AsyncIOMotorClient(
+    MONGO_URI, event_listeners=[MongoCommandListener(), slow_queries.listener]
+)
+db = client[MONGO_DB]
@@ -0,0 +1,56 @@
+from datetime import datetime, timezone
+
+from core.db import db
+
+# Who may submit on whose behalf through POST /submit-batch: one document per
+# (delegate_id, user_id) pair, e.g. an LGU office and each of its barangays.
+# Pairs are granted by operators with scripts/delegations.py only; nothing a
+# user can set through the API (profile fields included) grants one.
+
+
+async def allowed(delegate_id, user_ids) -> set:
+    """The subset of `user_ids` that `delegate_id` may submit for."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return set()
+    return {
+        doc["user_id"]
+        async for doc in db.delegations.find(
+            {"delegate_id": delegate_id, "user_id": {"$in": user_ids}}, {"user_id": 1}
+        )
+    }
+
+
+async def grant(delegate_id, user_ids) -> int:
+    now = datetime.now(timezone.utc)
+    granted = 0
+    for user_id in user_ids:
+        result = await db.delegations.update_one(
+            {"delegate_id": delegate_id, "user_id": user_id},
+            {"$setOnInsert": {"granted_at": now}},
+            upsert=True,
+        )
+        granted += result.upserted_id is not None
+    return granted
+
+
+async def revoke(delegate_id, user_ids=None) -> int:
+    """Revoke the given pairs, or every grant of `delegate_id`."""
+    query = {"delegate_id": delegate_id}
+    if user_ids is not None:
+        query["user_id"] = {"$in": list(user_ids)}
+    result = await db.delegations.delete_many(query)
+    return result.deleted_count
+
+
+async def delegated_users(delegate_id) -> list:
+    return [
+        doc["user_id"]
+        async for doc in db.delegations.find({"delegate_id": delegate_id}).sort("user_id", 1)
+    ]
+
+
+async def remove_user(user_id):
+    await db.delegations.delete_many(
+        {"$or": [{"delegate_id": user_id}, {"user_id": user_id}]}
+    )
@@ -0,0 +1,247 @@
+import numpy as np
+
+# Philippine-specific and IPCC Tier 1 emission factors (kg CO2e per unit).
+# Compiled once at import; both the scalar and the batch calculation read
+# these tables, and the order of each tuple is the order terms are summed in.
+FUEL_EF = {
+    "electricity": 0.709,
+    "lpg": 2.983,
+    "kerosene": 2.391,
+    "firewood": 0.015,
+    "diesel": 2.68,
+    "gasoline": 2.32,
+    "coal": 2.42,
+    "cng": 2.0,
+    "others": 2.0,
+}
+DEFAULT_FUEL_EF = 2.0
+
+ENERGY_FACTORS = (
+    ("electricity_consumed_kwh", FUEL_EF["electricity"]),
+    ("lpg_used_kg", FUEL_EF["lpg"]),
+    ("kerosene_used_liters", FUEL_EF["kerosene"]),
+    ("firewood_used_kg", FUEL_EF["firewood"]),
+    ("diesel_used_liters", FUEL_EF["diesel"]),
+    ("gasoline_used_liters", FUEL_EF["gasoline"]),
+    ("coal_used_kg", FUEL_EF["coal"]),
+)
+
+TRANSPORT_FIELDS = (
+    "number_of_vehicles",
+    "distance_travelled_daily_km",
+    "travel_frequency_per_week",
+    "trips_per_day",
+)
+
+WASTE_EF = {
+    "landfill": 1.8,
+    "open_dumping": 2.0,
+    "composting": 0.2,
+    "recycling": 0.0,
+    "incineration": 2.0,
+    "others": 1.0,
+}
+DEFAULT_WASTE_EF = 1.0
+METHANE_CAPTURE_FACTOR = 0.5  # 50% reduction for landfill methane capture
+
+AGRICULTURE_FACTORS = (
+    ("number_of_cattle", 912.5),
+    ("number_of_carabao", 730),
+    ("number_of_goats", 182.5),
+    ("number_of_pigs", 401.5),
+    ("number_of_chickens", 7.3),
+    ("fertilizer_applied_kg", 5.5),
+)
+RICE_EF = {
+    "continuous_flooding": 1200,
+    "intermittent_flooding": 800,
+    "dry_cultivation": 100,
+}
+DEFAULT_RICE_EF = 1200
+
+IPPU_FACTORS = (
+    ("cement_produced_tonnes", 800),
+    ("lime_produced_tonnes", 900),
+    ("steel_produced_tonnes", 1800),
+    ("refrigerant_consumed_kg", 1430),
+    ("solvent_used_liters", 2.0),
+    ("other_process_emissions_CO2e_tonnes", 1000),
+)
+
+# Categorical inputs and the value assumed when a submission omits them
+CATEGORICAL_DEFAULTS = {
+    "fuel_type": "diesel",
+    "waste_disposal_method": "landfill",
+    "methane_capture": False,
+    "rice_water_management": "continuous_flooding",
+}
+
+NUMERIC_FIELDS = {
+    "energy": tuple(field for field, _ in ENERGY_FACTORS),
+    "transport": TRANSPORT_FIELDS,
+    "waste": ("waste_generated_kg_per_month", "organic_fraction_percent"),
+    "agriculture": (
+        *(field for field, _ in AGRICULTURE_FACTORS),
+        "rice_paddy_area_hectares",
+    ),
+    "ippu": tuple(field for field, _ in IPPU_FACTORS),
+}
+CATEGORICAL_FIELDS = {
+    "energy": (),
+    "transport": ("fuel_type",),
+    "waste": ("waste_disposal_method", "methane_capture"),
+    "agriculture": ("rice_water_management",),
+    "ippu": (),
+}
+
+
+def _number(value):
+    return 0 if value is None else value
+
+
+def estimate_co2e(doc: dict) -> float:
+    """Estimated kg CO2e of a single submission, rounded to 2 decimals."""
+    sector = doc.get("sector")
+    co2e = 0.0
+
+    def value(field):
+        return _number(doc.get(field, 0))
+
+    if sector == "energy":
+        for field, ef in ENERGY_FACTORS:
+            co2e += value(field) * ef
+
+    elif sector == "transport":
+        fuel_type = (doc.get("fuel_type") or CATEGORICAL_DEFAULTS["fuel_type"]).lower()
+        fuel_ef = FUEL_EF.get(fuel_type, DEFAULT_FUEL_EF)
+        co2e = (
+            value("number_of_vehicles")
+            * value("distance_travelled_daily_km")
+            * value("travel_frequency_per_week")
+            * value("trips_per_day")
+            * fuel_ef
+        )
+
+    elif sector == "waste":
+        method = doc.get("waste_disposal_method", "landfill")
+        base_ef = WASTE_EF.get(method, DEFAULT_WASTE_EF)
+        if doc.get("methane_capture", False) and method == "landfill":
+            base_ef *= METHANE_CAPTURE_FACTOR
+        co2e = (
+            value("waste_generated_kg_per_month")
+            * (value("organic_fraction_percent") / 100.0)
+            * base_ef
+        )
+
+    elif sector == "agriculture":
+        (first, first_ef), *rest = AGRICULTURE_FACTORS
+        co2e = value(first) * first_ef
+        for field, ef in rest:
+            co2e = co2e + value(field) * ef
+        if value("rice_paddy_area_hectares") > 0:
+            water_mgmt = doc.get("rice_water_management", "continuous_flooding")
+            co2e += value("rice_paddy_area_hectares") * RICE_EF.get(
+                water_mgmt, DEFAULT_RICE_EF
+            )
+
+    elif sector == "ippu":
+        (first, first_ef), *rest = IPPU_FACTORS
+        co2e = value(first) * first_ef
+        for field, ef in rest:
+            co2e = co2e + value(field) * ef
+
+    return round(co2e, 2)
+
+
+def _lookup(values, table: dict, default) -> np.ndarray:
+    return np.fromiter(
+        (table.get(v, default) for v in values), dtype=np.float64, count=len(values)
+    )
+
+
+def sector_co2e(sector: str, columns: dict) -> np.ndarray:
+    """Unrounded kg CO2e for a column batch of submissions of one sector.
+
+    `columns` maps each field of NUMERIC_FIELDS[sector] to a float64 array
+    and each field of CATEGORICAL_FIELDS[sector] to a sequence of values.
+    Terms are combined in the same order as estimate_co2e, so rounding the
+    result gives identical figures.
+    """
+    if sector == "energy":
+        co2e = np.zeros(len(columns[ENERGY_FACTORS[0][0]]))
+        for field, ef in ENERGY_FACTORS:
+            co2e += columns[field] * ef
+        return co2e
+
+    if sector == "transport":
+        fuel_types = [
+            (f or CATEGORICAL_DEFAULTS["fuel_type"]).lower() for f in columns["fuel_type"]
+        ]
+        product = columns[TRANSPORT_FIELDS[0]]
+        for field in TRANSPORT_FIELDS[1:]:
+            product = product * columns[field]
+        return product * _lookup(fuel_types, FUEL_EF, DEFAULT_FUEL_EF)
+
+    if sector == "waste":
+        methods = columns["waste_disposal_method"]
+        base_ef = _lookup(methods, WASTE_EF, DEFAULT_WASTE_EF)
+        captured = np.fromiter(
+            (bool(c) and m == "landfill" for c, m in zip(columns["methane_capture"], methods)),
+            dtype=bool,
+            count=len(methods),
+        )
+        base_ef[captured] *= METHANE_CAPTURE_FACTOR
+        return (
+            columns["waste_generated_kg_per_month"]
+            * (columns["organic_fraction_percent"] / 100.0)
+            * base_ef
+        )
+
+    if sector == "agriculture":
+        (first, first_ef), *rest = AGRICULTURE_FACTORS
+        co2e = columns[first] * first_ef
+        for field, ef in rest:
+            co2e = co2e + columns[field] * ef
+        rice = columns["rice_paddy_area_hectares"]
+        rice_ef = _lookup(columns["rice_water_management"], RICE_EF, DEFAULT_RICE_EF)
+        return np.where(rice > 0, co2e + rice * rice_ef, co2e)
+
+    if sector == "ippu":
+        (first, first_ef), *rest = IPPU_FACTORS
+        co2e = columns[first] * first_ef
+        for field, ef in rest:
+            co2e = co2e + columns[field] * ef
+        return co2e
+
+    raise ValueError(f"Unknown sector: {sector!r}")
+
+
+def estimate_co2e_batch(docs: list) -> list:
+    """Estimated kg CO2e of many submissions of any sectors, rounded like
+    estimate_co2e and returned in input order."""
+    results = [0.0] * len(docs)
+    by_sector = {}
+    for i, doc in enumerate(docs):
+        by_sector.setdefault(doc.get("sector"), []).append(i)
+
+    for sector, indexes in by_sector.items():
+        if sector not in NUMERIC_FIELDS:
+            continue
+        rows = [docs[i] for i in indexes]
+        columns = {
+            field: np.fromiter(
+                (_number(row.get(field, 0)) for row in rows),
+                dtype=np.float64,
+                count=len(rows),
+            )
+            for field in NUMERIC_FIELDS[sector]
+        }
+        for field in CATEGORICAL_FIELDS[sector]:
+            default = CATEGORICAL_DEFAULTS[field]
+            columns[field] = [row.get(field, default) for row in rows]
+
+        # Python's round() on Python floats, as estimate_co2e does; numpy's
+        # rounding can differ in the last cent
+        for i, co2e in zip(indexes, sector_co2e(sector, columns).tolist()):
+            results[i] = round(co2e, 2)
+    return results
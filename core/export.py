@@ -0,0 +1,145 @@
+import csv
+import io
+import os
+import zipfile
+from datetime import datetime
+
+import numpy as np
+from dotenv import load_dotenv
+from fastapi.responses import StreamingResponse
+
+from core.emissions import CATEGORICAL_FIELDS, NUMERIC_FIELDS
+from core.submissions import GEO_FIELDS
+
+load_dotenv()
+
+# Bulk export of raw ghg_submissions for GET /api/ghg/export. Rows are read
+# from the cursor in EXPORT_BATCH_SIZE batches and written out in chunks, so
+# memory stays bounded by one chunk whatever the number of rows:
+#   csv  header line, then one line per submission
+#   npz  one NumPy .npz (zip) archive streamed as it is written; every chunk
+#        of EXPORT_CHUNK_ROWS rows adds one array per column, named
+#        "<chunk number>/<column>", e.g. "000000/estimated_co2e_kg"
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "50000"))
+CSV_CHUNK_ROWS = 1000
+FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "ghg-submissions.csv"),
+    "npz": ("application/octet-stream", "ghg-submissions.npz"),
+}
+BASE_COLUMNS = (
+    "_id",
+    "user_id",
+    "sector",
+    *GEO_FIELDS,
+    "created_at",
+    "estimated_co2e_kg",
+)
+
+
+def columns(sector=None) -> tuple:
+    """Exported columns: the common ones, plus the sector's inputs when the
+    export is limited to one sector."""
+    if sector is None:
+        return BASE_COLUMNS
+    return BASE_COLUMNS + NUMERIC_FIELDS[sector] + CATEGORICAL_FIELDS[sector]
+
+
+def _float_columns(names) -> set:
+    numeric = {field for fields in NUMERIC_FIELDS.values() for field in fields}
+    return {name for name in names if name in numeric or name == "estimated_co2e_kg"}
+
+
+async def _chunks(cursor, size: int):
+    chunk = []
+    async for doc in cursor:
+        chunk.append(doc)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+async def csv_chunks(cursor, names):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    async for rows in _chunks(cursor, CSV_CHUNK_ROWS):
+        writer.writerows([_csv_value(row.get(name)) for name in names] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _number(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _array(rows, name: str, floats: set) -> np.ndarray:
+    values = [row.get(name) for row in rows]
+    if name in floats:
+        return np.fromiter((_number(v) for v in values), dtype=np.float64, count=len(values))
+    if name == "created_at":
+        return np.array(values, dtype="datetime64[ms]")
+    return np.array(["" if v is None else str(v) for v in values], dtype=str)
+
+
+class _Sink:
+    """Write-only, unseekable file object collecting what zipfile writes;
+    zipfile then records sizes in data descriptors instead of seeking back."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def write(self, data) -> int:
+        self._buffer += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+async def npz_chunks(cursor, names):
+    floats = _float_columns(names)
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as archive:
+        number = 0
+        async for rows in _chunks(cursor, EXPORT_CHUNK_ROWS):
+            for name in names:
+                with archive.open(f"{number:06d}/{name}.npy", "w") as member:
+                    np.lib.format.write_array(
+                        member, _array(rows, name, floats), allow_pickle=False
+                    )
+            number += 1
+            yield sink.take()
+    yield sink.take()  # central directory
+
+
+def export_response(cursor, names, export_format: str) -> StreamingResponse:
+    """Stream the documents of `cursor` as a csv or npz download."""
+    media_type, filename = FORMATS[export_format]
+    body = csv_chunks(cursor, names) if export_format == "csv" else npz_chunks(cursor, names)
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
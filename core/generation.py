@@ -0,0 +1,59 @@
+import os
+import time
+
+from dotenv import load_dotenv
+from pymongo import ReturnDocument
+
+from core.db import db
+
+load_dotenv()
+
+# A counter that grows with every change to the data behind the analytics
+# endpoints (submissions, profile edits, account deletion, rebuilds). It is
+# shared by all workers through MongoDB and forms the ETag of cached
+# responses, so a client holding the current ETag can be answered 304
+# without any work.
+#
+# Each process reads the counter at most once per GENERATION_TTL seconds,
+# so cache hits do not cost a MongoDB round trip. A process sees its own
+# bumps at once; other workers and scripts' bumps show up within the TTL.
+COUNTER_ID = "data_generation"
+GENERATION_TTL = float(os.getenv("GENERATION_TTL", "1"))
+
+_known = (0.0, None)  # (expires_at, value)
+
+
+def _remember(value: int) -> int:
+    global _known
+    _known = (time.monotonic() + GENERATION_TTL, value)
+    return value
+
+
+async def current() -> int:
+    expires_at, value = _known
+    if value is not None and expires_at > time.monotonic():
+        return value
+    doc = await db.counters.find_one({"_id": COUNTER_ID})
+    return _remember(doc["value"] if doc else 0)
+
+
+async def bump() -> int:
+    doc = await db.counters.find_one_and_update(
+        {"_id": COUNTER_ID},
+        {"$inc": {"value": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return _remember(doc["value"])
+
+
+def etag(value: int) -> str:
+    return f'W/"g{value}"'
+
+
+def matches(if_none_match, tag: str) -> bool:
+    # If-None-Match holds "*" or a comma-separated list of entity tags
+    if not if_none_match:
+        return False
+    candidates = {candidate.strip() for candidate in if_none_match.split(",")}
+    return "*" in candidates or tag in candidates
@@ -0,0 +1,151 @@
+import logging
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from core.db import db
+
+logger = logging.getLogger(__name__)
+
+LLM_RETENTION = 30 * 24 * 3600  # seconds
+
+# Every index the application relies on, by collection. Applied at startup
+# by ensure_indexes(); names are explicit so verification can match them.
+INDEXES = {
+    "users": [
+        # register/login/get_current_user look users up by username and
+        # register already assumes it is unique
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+    ],
+    "tokens": [
+        IndexModel([("token", ASCENDING)], name="token_unique", unique=True),
+        # delete_user revokes every token of the account
+        IndexModel([("username", ASCENDING)], name="username"),
+    ],
+    "ghg_submissions": [
+        # submit's latest-submission lookup; its user_id prefix also serves
+        # the per-user summaries and the update/delete cascades
+        IndexModel(
+            [("user_id", ASCENDING), ("sector", ASCENDING), ("created_at", DESCENDING)],
+            name="user_sector_created",
+        ),
+        # my-submissions' keyset pages: one range scan in sort order
+        IndexModel(
+            [("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="user_created_id",
+        ),
+        # export's filters; sector-only exports read a fifth of the
+        # collection and are served about as well by a scan
+        IndexModel(
+            [("region", ASCENDING), ("sector", ASCENDING), ("created_at", ASCENDING)],
+            name="region_sector_created",
+        ),
+    ],
+    "ghg_rollups": [
+        # Upsert key for submit's $inc; leading region serves region filters
+        IndexModel(
+            [
+                ("region", ASCENDING),
+                ("city", ASCENDING),
+                ("community_type", ASCENDING),
+                ("sector", ASCENDING),
+                ("day", ASCENDING),
+            ],
+            name="rollup_key",
+            unique=True,
+        ),
+        # from/to range of the national trend endpoints
+        IndexModel([("day", ASCENDING)], name="day"),
+    ],
+    "ghg_user_totals": [
+        # Upsert key for submit's $inc and the per-user sector lookups
+        IndexModel(
+            [("user_id", ASCENDING), ("sector", ASCENDING)],
+            name="user_sector_unique",
+            unique=True,
+        ),
+        # Region filter of top-by-sector
+        IndexModel(
+            [("region", ASCENDING), ("sector", ASCENDING), ("total", DESCENDING)],
+            name="region_sector_total",
+        ),
+    ],
+    "ghg_leaderboard": [
+        # Top-N and (read backwards) bottom-N emitters, and rank counts
+        IndexModel([("total", DESCENDING), ("_id", ASCENDING)], name="total_desc"),
+    ],
+    "submission_windows": [
+        # Conditional upsert key of the once-per-week rule (core/windows.py);
+        # its uniqueness is what rejects a second submission in the window
+        IndexModel(
+            [("user_id", ASCENDING), ("scope", ASCENDING)],
+            name="user_scope_unique",
+            unique=True,
+        ),
+    ],
+    "delegations": [
+        # submit-batch's authorization lookup and the grant upsert key;
+        # delete_user's cascade on the delegate side
+        IndexModel(
+            [("delegate_id", ASCENDING), ("user_id", ASCENDING)],
+            name="delegate_user_unique",
+            unique=True,
+        ),
+        # delete_user's cascade on the delegated side
+        IndexModel([("user_id", ASCENDING)], name="user"),
+    ],
+    "llm_requests": [
+        IndexModel(
+            [("user_id", ASCENDING), ("endpoint", ASCENDING), ("requested_at", DESCENDING)],
+            name="user_endpoint_requested",
+        ),
+    ],
+    "llm_jobs": [
+        # A user's pending job and job lookups by id and user
+        IndexModel([("user_id", ASCENDING), ("status", ASCENDING)], name="user_status"),
+        # Jobs expire a month after creation
+        IndexModel([("created_at", ASCENDING)], name="created_ttl", expireAfterSeconds=LLM_RETENTION),
+        # Startup requeue of pending jobs
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="status_created"),
+    ],
+    "llm_results": [
+        # Cached interpretations are regenerated after a month
+        IndexModel([("created_at", ASCENDING)], name="created_ttl", expireAfterSeconds=LLM_RETENTION),
+    ],
+}
+
+
+def _differences(declared: IndexModel, existing: dict) -> list:
+    spec = declared.document
+    found = existing.get(spec["name"])
+    if found is None:
+        return ["missing"]
+    problems = []
+    if list(found["key"]) != list(spec["key"].items()):
+        problems.append(f"key is {found['key']}, expected {list(spec['key'].items())}")
+    if bool(found.get("unique")) != bool(spec.get("unique")):
+        problems.append(f"unique is {bool(found.get('unique'))}")
+    return problems
+
+
+async def ensure_indexes(database=db) -> list:
+    """Create the declared indexes, then check they exist as declared.
+
+    Returns a list of problems (empty when everything matches). Failures are
+    logged rather than raised so a conflicting index degrades performance
+    instead of keeping the API from starting.
+    """
+    problems = []
+    for collection, models in INDEXES.items():
+        try:
+            await database[collection].create_indexes(models)
+        except OperationFailure as e:
+            problems.append(f"{collection}: could not create indexes: {e}")
+            logger.error(problems[-1])
+
+        existing = await database[collection].index_information()
+        for model in models:
+            for problem in _differences(model, existing):
+                problems.append(f"{collection}.{model.document['name']}: {problem}")
+                logger.error(problems[-1])
+    return problems
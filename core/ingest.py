@@ -0,0 +1,65 @@
+from pymongo.errors import BulkWriteError
+
+from core import generation, leaderboard, rollups, user_totals
+from core.cache import GLOBAL, invalidate, region_tag, user_tag
+from core.db import db
+from core.submissions import GEO_FIELDS, user_geo
+from core.windows import WAITING_PERIOD
+
+# Write path shared by POST /submit and POST /submit-batch: document
+# construction, insertion and the derived-data updates that must follow
+# every insert. The waiting-period rule itself lives in core/windows.py.
+
+
+def waiting_period_message(sector: str, last_time) -> str:
+    next_allowed = last_time + WAITING_PERIOD
+    next_allowed_str = next_allowed.strftime("%Y-%m-%d %H:%M:%S UTC")
+    return (
+        f"You can only submit once every 7 days for the {sector} sector. "
+        f"Your next allowed submission will be on: {next_allowed_str}."
+    )
+
+
+async def current_geo(user_id):
+    """The user's geography as stored now, or None if the user is gone.
+
+    current_user may come from another worker's token cache entry made
+    before a profile change; stamping that copy onto new submissions would
+    file them (and their rollups) under the old region for good.
+    """
+    doc = await db.users.find_one({"_id": user_id}, {field: 1 for field in GEO_FIELDS})
+    return doc and user_geo(doc)
+
+
+def submission_doc(data: dict, user: dict, now, co2e: float) -> dict:
+    return {
+        **data,
+        "user_id": user["_id"],
+        **user_geo(user),
+        "created_at": now,
+        "updated_at": now,
+        "estimated_co2e_kg": co2e,
+    }
+
+
+async def store_submissions(docs: list) -> set:
+    """Insert submissions unordered, then update rollups, invalidate the
+    response cache and bump the data generation for the ones stored.
+    Returns the indexes of failed docs."""
+    failed = set()
+    try:
+        await db.ghg_submissions.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        failed = {error["index"] for error in e.details["writeErrors"]}
+
+    stored = [doc for i, doc in enumerate(docs) if i not in failed]
+    if stored:
+        await rollups.record_submissions(stored)
+        await user_totals.record_submissions(stored)
+        await leaderboard.record_submissions(stored)
+        tags = {GLOBAL}
+        for doc in stored:
+            tags.update((region_tag(doc.get("region")), user_tag(doc["user_id"])))
+        await invalidate(*tags)
+        await generation.bump()
+    return failed
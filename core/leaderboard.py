@@ -0,0 +1,142 @@
+import math
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+
+from core.db import db
+
+# ghg_leaderboard holds one document per user who has submitted data: _id is
+# the user id, total the user's summed emissions across sectors, plus the
+# profile fields the emitter rankings display. The (total, _id) index serves
+# top-N and bottom-N reads and rank counts without sorting every user.
+PROFILE_FIELDS = ("username", "community_name", "region", "city")
+
+
+def profile(user: dict) -> dict:
+    return {field: user.get(field) for field in PROFILE_FIELDS}
+
+
+def percentile(position: int, count: int) -> float:
+    return round(position / count * 100, 2)
+
+
+async def record_submissions(docs):
+    totals = {}
+    for doc in docs:
+        totals[doc["user_id"]] = totals.get(doc["user_id"], 0.0) + doc["estimated_co2e_kg"]
+    if not totals:
+        return
+    result = await db.ghg_leaderboard.bulk_write(
+        [
+            UpdateOne({"_id": user_id}, {"$inc": {"total": total}}, upsert=True)
+            for user_id, total in totals.items()
+        ],
+        ordered=False,
+    )
+    # First submission of a user: copy the profile fields once
+    new_ids = list(result.upserted_ids.values())
+    if new_ids:
+        users = await db.users.find(
+            {"_id": {"$in": new_ids}}, dict.fromkeys(PROFILE_FIELDS, 1)
+        ).to_list(None)
+        if users:
+            await db.ghg_leaderboard.bulk_write(
+                [UpdateOne({"_id": u["_id"]}, {"$set": profile(u)}) for u in users],
+                ordered=False,
+            )
+
+
+async def update_profile(user: dict):
+    await db.ghg_leaderboard.update_one({"_id": user["_id"]}, {"$set": profile(user)})
+
+
+async def remove_user(user_id):
+    await db.ghg_leaderboard.delete_one({"_id": user_id})
+
+
+async def count() -> int:
+    return await db.ghg_leaderboard.estimated_document_count()
+
+
+async def top(limit: int) -> list:
+    return await (
+        db.ghg_leaderboard.find()
+        .sort([("total", DESCENDING), ("_id", ASCENDING)])
+        .limit(limit)
+        .to_list(None)
+    )
+
+
+async def bottom(limit: int) -> list:
+    return await (
+        db.ghg_leaderboard.find()
+        .sort([("total", ASCENDING), ("_id", DESCENDING)])
+        .limit(limit)
+        .to_list(None)
+    )
+
+
+async def rank(user_id):
+    """(entry, rank) of a user, rank 1 being the highest total; ties share
+    the best rank. None when the user has no submissions."""
+    entry = await db.ghg_leaderboard.find_one({"_id": user_id})
+    if entry is None:
+        return None
+    above = await db.ghg_leaderboard.count_documents({"total": {"$gt": entry["total"]}})
+    return entry, above + 1
+
+
+def raw_leaderboard_pipeline() -> list:
+    # The same documents as ghg_leaderboard, computed from raw submissions.
+    # Submissions of deleted users have no profile and are left out.
+    return [
+        {"$group": {"_id": "$user_id", "total": {"$sum": "$estimated_co2e_kg"}}},
+        {
+            "$lookup": {
+                "from": "users",
+                "localField": "_id",
+                "foreignField": "_id",
+                "as": "user",
+            }
+        },
+        {"$unwind": "$user"},
+        {
+            "$project": {
+                "total": 1,
+                **{field: f"$user.{field}" for field in PROFILE_FIELDS},
+            }
+        },
+    ]
+
+
+async def rebuild():
+    # Same caveat as rollups.rebuild(): increments made while this runs are
+    # lost, so run it during a quiet period or follow it with verify()
+    await db.ghg_submissions.aggregate(
+        raw_leaderboard_pipeline() + [{"$out": "ghg_leaderboard"}], allowDiskUse=True
+    ).to_list(None)
+
+
+async def verify(tolerance: float = 0.01) -> list:
+    """Compare ghg_leaderboard against raw submissions and user profiles.
+
+    Returns mismatches as (user_id, expected, actual) tuples.
+    """
+    expected = {
+        doc["_id"]: doc
+        for doc in await db.ghg_submissions.aggregate(
+            raw_leaderboard_pipeline(), allowDiskUse=True
+        ).to_list(None)
+    }
+    actual = {doc["_id"]: doc async for doc in db.ghg_leaderboard.find()}
+
+    mismatches = []
+    for user_id in expected.keys() | actual.keys():
+        want, got = expected.get(user_id), actual.get(user_id)
+        if (
+            want is None
+            or got is None
+            or not math.isclose(want["total"], got["total"], abs_tol=tolerance)
+            or profile(want) != profile(got)
+        ):
+            mismatches.append((user_id, want, got))
+    return mismatches
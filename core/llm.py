@@ -0,0 +1,273 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Text generation behind my-summary-interpret, selected by LLM_BACKEND:
+#   hf    (default) Hugging Face Inference API, HF_MODEL with
+#         HUGGINGFACEHUB_API_TOKEN
+#   local small causal LM on CPU through transformers, no network:
+#         LOCAL_MODEL       model id or path
+#         LOCAL_PROCESSES   inference processes, each holding a model copy
+#         LOCAL_THREADS     torch threads per process
+#         LLM_BATCH_WINDOW_MS, LLM_MAX_BATCH
+#                           prompts arriving within the window are generated
+#                           together, up to LLM_MAX_BATCH per call
+#   stub  deterministic local text, no network; for tests and benchmarks
+LLM_BACKEND = os.getenv("LLM_BACKEND", "hf")
+# Concurrent generations of the hf and stub backends
+LLM_WORKERS = int(os.getenv("LLM_WORKERS", "2"))
+HF_MODEL = os.getenv("HF_MODEL", "mistralai/Mistral-7B-Instruct-v0.2")
+LOCAL_MODEL = os.getenv("LOCAL_MODEL", "HuggingFaceTB/SmolLM2-360M-Instruct")
+LOCAL_PROCESSES = int(os.getenv("LOCAL_PROCESSES", "1"))
+LOCAL_THREADS = int(os.getenv("LOCAL_THREADS", "4"))
+LLM_BATCH_WINDOW_MS = int(os.getenv("LLM_BATCH_WINDOW_MS", "50"))
+LLM_MAX_BATCH = int(os.getenv("LLM_MAX_BATCH", "8"))
+SYSTEM_PROMPT = "You are a helpful sustainability expert."
+TEMPERATURE = 0.7
+MAX_NEW_TOKENS = 400
+
+
+class HFBackend:
+    """Remote chat completion on the Hugging Face Inference API.
+
+    The client is blocking, so calls run on a thread pool of their own
+    rather than the one serving sync endpoints and run_in_threadpool.
+    """
+
+    def __init__(self, model: str, token: str = None, workers: int = LLM_WORKERS):
+        from huggingface_hub import InferenceClient
+
+        self.name = f"hf:{model}"
+        self.concurrency = workers
+        self._client = InferenceClient(model=model, token=token)
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="llm"
+        )
+
+    def _generate(self, prompt: str) -> str:
+        return (
+            self._client.chat_completion(
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt},
+                ],
+                temperature=TEMPERATURE,
+                max_tokens=MAX_NEW_TOKENS,
+            )
+            .choices[0]
+            .message["content"]
+            .strip()
+        )
+
+    async def generate(self, prompt: str) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._generate, prompt)
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# State of a local inference process, set by _load_model
+_model = None
+_tokenizer = None
+
+
+def _load_model(model: str, threads: int):
+    global _model, _tokenizer
+    import torch
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    torch.set_num_threads(threads)
+    _tokenizer = AutoTokenizer.from_pretrained(model, padding_side="left")
+    if _tokenizer.pad_token is None:
+        _tokenizer.pad_token = _tokenizer.eos_token
+    _model = AutoModelForCausalLM.from_pretrained(model, torch_dtype=torch.float32)
+    _model.eval()
+
+
+def _ready() -> bool:
+    return _model is not None
+
+
+def _generate_batch(prompts: list, max_new_tokens: int):
+    """Generate replies to `prompts` in one padded forward pass per step.
+
+    Runs in an inference process; returns (texts, generated token count).
+    """
+    import torch
+
+    chats = [
+        _tokenizer.apply_chat_template(
+            [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt},
+            ],
+            tokenize=False,
+            add_generation_prompt=True,
+        )
+        for prompt in prompts
+    ]
+    inputs = _tokenizer(chats, return_tensors="pt", padding=True)
+    with torch.inference_mode():
+        output = _model.generate(
+            **inputs,
+            max_new_tokens=max_new_tokens,
+            do_sample=True,
+            temperature=TEMPERATURE,
+            pad_token_id=_tokenizer.pad_token_id,
+        )
+    generated = output[:, inputs["input_ids"].shape[1]:]
+    texts = [t.strip() for t in _tokenizer.batch_decode(generated, skip_special_tokens=True)]
+    tokens = int((generated != _tokenizer.pad_token_id).sum())
+    return texts, tokens
+
+
+class LocalBackend:
+    """Causal LM on CPU in a pool of inference processes.
+
+    Prompts are collected for up to `window` seconds (or `max_batch`
+    prompts) and generated with one batched generate() call, which costs
+    little more than a single prompt on CPU. Processes are spawned rather
+    than forked and load the model once, at startup.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        processes: int = LOCAL_PROCESSES,
+        threads: int = LOCAL_THREADS,
+        window: float = LLM_BATCH_WINDOW_MS / 1000,
+        max_batch: int = LLM_MAX_BATCH,
+        max_new_tokens: int = MAX_NEW_TOKENS,
+    ):
+        self.name = f"local:{model}"
+        # Enough job workers to fill a batch on every process
+        self.concurrency = processes * max_batch
+        self.window = window
+        self.max_batch = max_batch
+        self.max_new_tokens = max_new_tokens
+        self._pool = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_load_model,
+            initargs=(model, threads),
+        )
+        for _ in range(processes):
+            self._pool.submit(_ready)
+        # One batch per process at a time; later prompts keep collecting
+        self._slots = asyncio.Semaphore(processes)
+        self._pending = []  # (prompt, future) waiting for the next batch
+        self._collector = None
+        self._batches = set()  # running batch tasks, referenced until done
+        self.requests = 0
+        self.batches = 0
+        self.tokens = 0
+        self.busy_seconds = 0.0
+        self.last_tokens_per_second = 0.0
+
+    async def generate(self, prompt: str) -> str:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((prompt, future))
+        if self._collector is None or self._collector.done():
+            self._collector = asyncio.create_task(self._collect())
+        return await future
+
+    async def _collect(self):
+        while self._pending:
+            await self._slots.acquire()
+            deadline = time.monotonic() + self.window
+            while len(self._pending) < self.max_batch and time.monotonic() < deadline:
+                await asyncio.sleep(min(0.005, self.window))
+            batch = self._pending[: self.max_batch]
+            del self._pending[: self.max_batch]
+            task = asyncio.create_task(self._run_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch: list):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            texts, tokens = await loop.run_in_executor(
+                self._pool, _generate_batch, [p for p, _ in batch], self.max_new_tokens
+            )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+        elapsed = time.perf_counter() - started
+        self.requests += len(batch)
+        self.batches += 1
+        self.tokens += tokens
+        self.busy_seconds += elapsed
+        self.last_tokens_per_second = round(tokens / elapsed, 2) if elapsed else 0.0
+        for (_, future), text in zip(batch, texts):
+            if not future.done():
+                future.set_result(text)
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch_size": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "pending": len(self._pending),
+            "running_batches": len(self._batches),
+            "generated_tokens": self.tokens,
+            "tokens_per_second": round(self.tokens / self.busy_seconds, 2)
+            if self.busy_seconds
+            else 0.0,
+            "last_batch_tokens_per_second": self.last_tokens_per_second,
+        }
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class StubBackend:
+    """Answers with a fixed text echoing the prompt length, after an
+    optional delay standing in for model latency."""
+
+    name = "stub"
+    concurrency = LLM_WORKERS
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+
+    async def generate(self, prompt: str) -> str:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return (
+            f"- Reduce emissions in the largest sector first.\n"
+            f"- Share transport and switch to efficient equipment.\n"
+            f"- Offset the remainder through mangrove or tree planting. "
+            f"({len(prompt)} prompt characters)"
+        )
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+    def close(self):
+        pass
+
+
+def backend_from_env():
+    if LLM_BACKEND == "stub":
+        return StubBackend(delay=float(os.getenv("LLM_STUB_DELAY", "0")))
+    if LLM_BACKEND == "hf":
+        return HFBackend(HF_MODEL, token=os.getenv("HUGGINGFACEHUB_API_TOKEN"))
+    if LLM_BACKEND == "local":
+        return LocalBackend(LOCAL_MODEL)
+    raise ValueError(f"Unknown LLM_BACKEND {LLM_BACKEND!r}, expected hf, local or stub")
@@ -0,0 +1,232 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from bson.objectid import ObjectId
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+
+from core import windows
+from core.db import db
+from core.llm import backend_from_env
+from core.metrics import LLM_SECONDS
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Background generation for my-summary-interpret. The endpoint stores a job in
+# llm_jobs and returns its id; asyncio workers per process (as many as the
+# backend runs concurrently) take jobs off a bounded queue and run them on the configured backend
+# (core/llm.py). Generated text is kept in llm_results keyed by a hash of the
+# model and its inputs, so identical sector totals and community context
+# never reach the model twice.
+LLM_QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", "100"))
+# Jobs still running after this long were lost with a stopped process
+JOB_TIMEOUT = timedelta(minutes=10)
+ENDPOINT = windows.LLM_ENDPOINT
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+_queue: asyncio.Queue = None
+_queued = set()  # job ids in _queue
+# Set when queued jobs in llm_jobs did not fit in _queue; workers then queue
+# them as slots free up
+_backlog = False
+_workers = []
+_inflight = {}  # input key -> task generating it in this process
+backend = None
+
+
+def input_key(context: dict, labels: list, data: list) -> str:
+    payload = {"model": backend.name, "context": context, "labels": labels, "data": data}
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+async def record_request(user_id, requested_at):
+    # Log of completed interpretations; requested_at is the time the weekly
+    # window was taken (core/windows.py), so the log can rebuild the ledger
+    await db.llm_requests.insert_one(
+        {"user_id": user_id, "endpoint": ENDPOINT, "requested_at": requested_at}
+    )
+
+
+async def active_job(user_id):
+    return await db.llm_jobs.find_one(
+        {"user_id": user_id, "status": {"$in": [QUEUED, RUNNING]}}
+    )
+
+
+async def enqueue(user_id, now, key: str, prompt: str, payload: dict) -> dict:
+    """Create a job for `prompt` at `now`, the time the user's window was
+    taken; answered at once when `key` has a cached result. `payload` is
+    stored on the job and returned with its result.
+
+    Raises 503 when the queue is full.
+    """
+    job = {
+        "user_id": user_id,
+        "key": key,
+        "prompt": prompt,
+        "payload": payload,
+        "status": QUEUED,
+        "created_at": now,
+    }
+    cached = await db.llm_results.find_one({"_id": key})
+    if cached:
+        job.update(status=DONE, result=cached["text"], cached=True, finished_at=now)
+        job["_id"] = (await db.llm_jobs.insert_one(job)).inserted_id
+        await record_request(user_id, now)
+        return job
+
+    if _queue is None or _queue.full():
+        raise HTTPException(
+            status_code=503, detail="Too many interpretations in progress, try again later"
+        )
+    job["_id"] = (await db.llm_jobs.insert_one(job)).inserted_id
+    _put(job["_id"])
+    return job
+
+
+def _put(job_id):
+    _queued.add(job_id)
+    _queue.put_nowait(job_id)
+
+
+async def _fill():
+    """Queue pending jobs from llm_jobs, oldest first, while there is room."""
+    global _backlog
+    _backlog = False
+    async for job in db.llm_jobs.find(
+        {"status": QUEUED, "_id": {"$nin": list(_queued)}}, {"_id": 1}
+    ).sort("created_at", 1):
+        if _queue.full():
+            _backlog = True
+            break
+        _put(job["_id"])
+
+
+async def get_job(job_id: str, user_id):
+    if not ObjectId.is_valid(job_id):
+        return None
+    return await db.llm_jobs.find_one({"_id": ObjectId(job_id), "user_id": user_id})
+
+
+async def _generate_and_store(key: str, prompt: str) -> str:
+    started = time.perf_counter()
+    try:
+        text = await backend.generate(prompt)
+    except Exception:
+        LLM_SECONDS.labels(backend.name, "error").observe(time.perf_counter() - started)
+        raise
+    LLM_SECONDS.labels(backend.name, "ok").observe(time.perf_counter() - started)
+    await db.llm_results.replace_one(
+        {"_id": key},
+        {"text": text, "model": backend.name, "created_at": datetime.now(timezone.utc)},
+        upsert=True,
+    )
+    return text
+
+
+async def _interpret(key: str, prompt: str):
+    cached = await db.llm_results.find_one({"_id": key})
+    if cached:
+        return cached["text"], True
+    # An identical job already generating in this process is awaited rather
+    # than started again
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_generate_and_store(key, prompt))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    return await asyncio.shield(task), False
+
+
+async def _run(job_id):
+    # Claiming atomically keeps a job from running twice when several
+    # processes requeue pending jobs on startup
+    job = await db.llm_jobs.find_one_and_update(
+        {"_id": job_id, "status": QUEUED},
+        {"$set": {"status": RUNNING, "started_at": datetime.now(timezone.utc)}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if job is None:
+        return
+    try:
+        text, cached = await _interpret(job["key"], job["prompt"])
+    except asyncio.CancelledError:
+        # Shutting down: hand the job to the next process that starts
+        await db.llm_jobs.update_one({"_id": job_id}, {"$set": {"status": QUEUED}})
+        raise
+    except Exception as e:
+        logger.exception("Interpretation job %s failed", job_id)
+        update = {"status": FAILED, "error": f"LLM failed to generate interpretation: {e}"}
+        # Failed interpretations do not use up the weekly window
+        await windows.release([(job["user_id"], windows.LLM_SCOPE)], job["created_at"])
+    else:
+        update = {"status": DONE, "result": text, "cached": cached}
+        await record_request(job["user_id"], job["created_at"])
+    update["finished_at"] = datetime.now(timezone.utc)
+    await db.llm_jobs.update_one({"_id": job_id}, {"$set": update})
+
+
+async def _worker():
+    while True:
+        job_id = await _queue.get()
+        _queued.discard(job_id)
+        try:
+            if _backlog:
+                await _fill()
+            await _run(job_id)
+        except Exception:  # keep the worker alive
+            logger.exception("Interpretation worker error on job %s", job_id)
+        finally:
+            _queue.task_done()
+
+
+async def _recover():
+    now = datetime.now(timezone.utc)
+    async for job in db.llm_jobs.find(
+        {"status": RUNNING, "started_at": {"$lt": now - JOB_TIMEOUT}}
+    ):
+        await db.llm_jobs.update_one(
+            {"_id": job["_id"], "status": RUNNING},
+            {"$set": {"status": FAILED, "error": "Interrupted, please request again", "finished_at": now}},
+        )
+        await windows.release([(job["user_id"], windows.LLM_SCOPE)], job["created_at"])
+    await _fill()
+
+
+async def start():
+    """Start the worker pool; called from the lifespan hook in main.py."""
+    global _queue, backend
+    backend = backend_from_env()
+    _queue = asyncio.Queue(maxsize=LLM_QUEUE_SIZE)
+    _workers.extend(asyncio.create_task(_worker()) for _ in range(backend.concurrency))
+    await _recover()
+
+
+def stats() -> dict:
+    return {
+        "workers": len(_workers),
+        "queued": _queue.qsize() if _queue else 0,
+        "backlog": _backlog,
+        "queue_size": LLM_QUEUE_SIZE,
+        "generating": len(_inflight),
+        **backend.stats(),
+    }
+
+
+async def stop():
+    # Unfinished jobs stay queued in llm_jobs and are picked up on restart
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    backend.close()
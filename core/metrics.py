@@ -0,0 +1,132 @@
+import os
+import time
+from contextvars import ContextVar
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from pymongo import monitoring
+from starlette.responses import Response
+
+# Prometheus metrics served at /metrics (registered in main.py). Everything
+# is a counter or histogram so that with several uvicorn workers, setting
+# PROMETHEUS_MULTIPROC_DIR to an empty directory aggregates all of them.
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+)
+MONGO_SECONDS = Histogram(
+    "mongodb_command_duration_seconds",
+    "MongoDB command duration by collection and command name",
+    ["command", "collection", "outcome"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+CACHE_REQUESTS = Counter(
+    "response_cache_requests_total",
+    "Response cache lookups by cached endpoint",
+    ["endpoint", "result"],
+)
+CACHE_EVICTIONS = Counter(
+    "response_cache_evictions_total",
+    "Entries dropped by the memory and sqlite cache backends to stay under their bound",
+    ["endpoint"],
+)
+LLM_SECONDS = Histogram(
+    "llm_generation_duration_seconds",
+    "Time to generate one summary interpretation",
+    ["backend", "outcome"],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120),
+)
+
+UNMATCHED = "unmatched"
+# ASGI scope of the request being served; scope["route"] is filled in once
+# routed, so command listeners can tell which route issued a query
+current_scope = ContextVar("current_scope", default=None)
+CACHE_STATUS_HEADER = b"x-fastapi-cache"
+
+
+class MetricsMiddleware:
+    """Times every HTTP request and counts response cache hits and misses.
+
+    A plain ASGI middleware: it only wraps `send` to note the status and the
+    X-FastAPI-Cache header, and labels requests with the route template
+    (scope["route"], set by the router) so the label set stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+        cache_result = None
+
+        async def send_wrapper(message):
+            nonlocal status, cache_result
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                for name, value in message.get("headers", ()):
+                    if name.lower() == CACHE_STATUS_HEADER:
+                        cache_result = value.decode().lower()
+            await send(message)
+
+        current_scope.set(scope)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            REQUEST_SECONDS.labels(
+                scope["method"], route.path if route else UNMATCHED, str(status)
+            ).observe(time.perf_counter() - started)
+            if cache_result and route:
+                CACHE_REQUESTS.labels(route.name, cache_result).inc()
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Feeds MONGO_SECONDS from pymongo's command monitoring events."""
+
+    def __init__(self):
+        self._collections = {}  # (connection, request id) -> collection
+
+    def started(self, event):
+        name = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            name = event.command.get("collection")
+        if isinstance(name, str):
+            self._collections[(event.connection_id, event.request_id)] = name
+
+    def _observe(self, event, outcome: str):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        MONGO_SECONDS.labels(event.command_name, collection, outcome).observe(
+            event.duration_micros / 1e6
+        )
+
+    def succeeded(self, event):
+        self._observe(event, "ok")
+
+    def failed(self, event):
+        self._observe(event, "error")
+
+
+def cache_endpoint(key: str) -> str:
+    # Response cache keys look like "<prefix>::<endpoint>:<hash>:<versions>"
+    # (core/cache.py); anything else is a tag version
+    _, sep, rest = key.partition("::")
+    return rest.split(":", 1)[0] if sep else "tag"
+
+
+async def metrics_response() -> Response:
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
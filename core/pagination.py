@@ -0,0 +1,39 @@
+import base64
+import binascii
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+
+# Keyset pagination over (created_at, _id), newest first. The cursor handed
+# to clients encodes the sort key of the last row of a page; the next page
+# starts strictly after it, so every page is one bounded index range scan
+# however deep into the history it is (unlike skip, which walks past all
+# earlier rows). _id breaks ties between rows with the same created_at.
+SORT = [("created_at", -1), ("_id", -1)]
+
+
+def encode_cursor(doc: dict) -> str:
+    key = f"{doc['created_at'].isoformat()}|{doc['_id']}"
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        key = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, _, oid = key.partition("|")
+        return datetime.fromisoformat(created_at), ObjectId(oid)
+    except (binascii.Error, UnicodeDecodeError, ValueError, InvalidId, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def after(cursor: str) -> dict:
+    """Filter for the rows following `cursor` in SORT order."""
+    created_at, oid = decode_cursor(cursor)
+    return {
+        "$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": oid}},
+        ]
+    }
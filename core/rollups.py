@@ -0,0 +1,170 @@
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from core.db import db
+from core.submissions import GEO_FIELDS
+
+# ghg_rollups holds one document per (day, region, city, community_type,
+# sector) with the summed emissions and submission count, so dashboard
+# aggregations group a few thousand rollup rows instead of every submission.
+ROLLUP_DIMENSIONS = (*GEO_FIELDS, "sector")
+
+
+def day_of(moment: datetime) -> datetime:
+    return datetime(moment.year, moment.month, moment.day)
+
+
+def rollup_key(doc: dict) -> dict:
+    key = {field: doc.get(field) for field in ROLLUP_DIMENSIONS}
+    key["day"] = day_of(doc["created_at"])
+    return key
+
+
+def rollup_updates(docs, sign: int = 1) -> list:
+    # Merge submissions that land in the same rollup row into a single $inc
+    merged = {}
+    for doc in docs:
+        key = rollup_key(doc)
+        row = merged.setdefault(tuple(key.values()), [key, 0.0, 0])
+        row[1] += doc["estimated_co2e_kg"]
+        row[2] += 1
+    return [
+        UpdateOne(
+            key,
+            {"$inc": {"total_emissions": sign * total, "count": sign * count}},
+            upsert=True,
+        )
+        for key, total, count in merged.values()
+    ]
+
+
+async def record_submissions(docs):
+    updates = rollup_updates(docs)
+    if updates:
+        await db.ghg_rollups.bulk_write(updates, ordered=False)
+
+
+async def _user_daily_totals(user_id) -> list:
+    # A user's submissions summed per (day, sector), shaped like submissions
+    # so they can be fed back through rollup_updates
+    pipeline = [
+        {"$match": {"user_id": user_id}},
+        {
+            "$group": {
+                "_id": {
+                    "day": {"$dateTrunc": {"date": "$created_at", "unit": "day"}},
+                    "sector": "$sector",
+                },
+                "total_emissions": {"$sum": "$estimated_co2e_kg"},
+                "count": {"$sum": 1},
+            }
+        },
+    ]
+    return await db.ghg_submissions.aggregate(pipeline).to_list(None)
+
+
+def _shift(rows, geo: dict, sign: int) -> list:
+    return [
+        UpdateOne(
+            {**geo, "sector": r["_id"]["sector"], "day": r["_id"]["day"]},
+            {
+                "$inc": {
+                    "total_emissions": sign * r["total_emissions"],
+                    "count": sign * r["count"],
+                }
+            },
+            upsert=True,
+        )
+        for r in rows
+    ]
+
+
+async def move_user(user_id, old_geo: dict, new_geo: dict):
+    rows = await _user_daily_totals(user_id)
+    if not rows:
+        return
+    await db.ghg_rollups.bulk_write(
+        _shift(rows, old_geo, -1) + _shift(rows, new_geo, 1), ordered=False
+    )
+    await db.ghg_rollups.delete_many({"count": {"$lte": 0}})
+
+
+async def remove_user(user_id, geo: dict):
+    # Must run before the user's submissions are deleted
+    rows = await _user_daily_totals(user_id)
+    if not rows:
+        return
+    await db.ghg_rollups.bulk_write(_shift(rows, geo, -1), ordered=False)
+    await db.ghg_rollups.delete_many({"count": {"$lte": 0}})
+
+
+def raw_rollup_pipeline() -> list:
+    # The same rows as ghg_rollups, computed from raw submissions
+    return [
+        {
+            "$group": {
+                "_id": {
+                    "day": {"$dateTrunc": {"date": "$created_at", "unit": "day"}},
+                    **{field: f"${field}" for field in ROLLUP_DIMENSIONS},
+                },
+                "total_emissions": {"$sum": "$estimated_co2e_kg"},
+                "count": {"$sum": 1},
+            }
+        },
+        {
+            "$project": {
+                "_id": 0,
+                "day": "$_id.day",
+                **{field: f"$_id.{field}" for field in ROLLUP_DIMENSIONS},
+                "total_emissions": 1,
+                "count": 1,
+            }
+        },
+    ]
+
+
+async def rebuild():
+    # $out swaps the new collection in atomically and keeps existing indexes.
+    # Increments from submissions made while this runs are lost, so run it
+    # during a quiet period or follow it with verify().
+    await db.ghg_submissions.aggregate(
+        raw_rollup_pipeline() + [{"$out": "ghg_rollups"}], allowDiskUse=True
+    ).to_list(None)
+
+
+async def verify(tolerance: float = 0.01) -> list:
+    """Compare ghg_rollups against a fresh aggregation of ghg_submissions.
+
+    Returns the mismatching rows as (key, expected, actual) tuples, where
+    expected/actual are (total_emissions, count) or None when missing.
+    """
+
+    def index(rows):
+        indexed = {}
+        for r in rows:
+            key = (r["day"], *(r.get(field) for field in ROLLUP_DIMENSIONS))
+            total, count = indexed.get(key, (0.0, 0))
+            indexed[key] = (total + r["total_emissions"], count + r["count"])
+        return indexed
+
+    expected = index(
+        await db.ghg_submissions.aggregate(
+            raw_rollup_pipeline(), allowDiskUse=True
+        ).to_list(None)
+    )
+    actual = index(
+        await db.ghg_rollups.find({"count": {"$gt": 0}}, {"_id": 0}).to_list(None)
+    )
+
+    mismatches = []
+    for key in expected.keys() | actual.keys():
+        want, got = expected.get(key), actual.get(key)
+        if (
+            want is None
+            or got is None
+            or want[1] != got[1]
+            or abs(want[0] - got[0]) > tolerance
+        ):
+            mismatches.append((key, want, got))
+    return mismatches
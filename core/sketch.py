@@ -0,0 +1,49 @@
+import math
+
+# DDSketch-style quantile sketch of non-negative values: a histogram whose
+# bucket i holds the values in (GAMMA**(i-1), GAMMA**i], plus one bucket for
+# zeros. Bucket counts simply add up, so sketches can be updated with $inc
+# and merged by summing buckets.
+#
+# Error bound: rank_below() counts every value in a lower bucket. The only
+# values it can miss are smaller ones sharing the queried value's bucket,
+# i.e. values within a factor GAMMA (about 2% for 1% relative accuracy)
+# below it, so a percentile rank is never overstated and is understated by
+# at most the share of values that close to the queried one.
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(GAMMA)
+ZERO = "zero"
+
+
+def bucket_key(value: float) -> str:
+    # String keys: they are field names of the stored buckets subdocument
+    if value <= 0:
+        return ZERO
+    return str(math.ceil(math.log(value) / _LOG_GAMMA))
+
+
+def rank_below(buckets: dict, value: float) -> int:
+    """Number of sketched values in buckets below the one of `value`."""
+    if value <= 0:
+        return 0
+    own = int(bucket_key(value))
+    below = buckets.get(ZERO, 0)
+    for key, count in buckets.items():
+        if key != ZERO and int(key) < own:
+            below += count
+    return below
+
+
+def bucket_increments(changes) -> dict:
+    """$inc amounts per bucket key for (old, new) value changes; old is None
+    for values entering the sketch and new is None for values leaving it."""
+    increments = {}
+    for old, new in changes:
+        if old is not None:
+            key = bucket_key(old)
+            increments[key] = increments.get(key, 0) - 1
+        if new is not None:
+            key = bucket_key(new)
+            increments[key] = increments.get(key, 0) + 1
+    return {key: count for key, count in increments.items() if count}
@@ -0,0 +1,141 @@
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+from pymongo import monitoring
+
+from core.metrics import current_scope
+
+load_dotenv()
+
+# Slow-query log fed by pymongo command monitoring: every aggregate and find
+# slower than SLOW_QUERY_MS is recorded with its shape (the command with
+# literal values replaced by "?"), the route that issued it and its duration.
+# The newest SLOW_QUERY_BUFFER records are kept in memory for
+# /api/ops/slow-queries, which can also run explain on one of them; with
+# SLOW_QUERY_LOG set, shapes are appended to that JSONL file as well.
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_BUFFER = int(os.getenv("SLOW_QUERY_BUFFER", "200"))
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG")
+COMMANDS = ("aggregate", "find")
+# Fields of the command that are not part of the query itself
+DRIVER_FIELDS = {"$db", "lsid", "$clusterTime", "$readPreference", "txnNumber", "cursor", "batchSize"}
+
+
+def shape(value):
+    """`value` with every literal replaced by "?" (keys and operators stay)."""
+    if isinstance(value, dict):
+        return {key: shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        # An $in list or a pipeline: keep pipelines stage by stage, collapse
+        # literal lists so their length does not make shapes differ
+        if value and all(isinstance(item, dict) for item in value):
+            return [shape(item) for item in value]
+        return ["?"] if value else []
+    if isinstance(value, str) and value.startswith("$"):
+        return value  # field path
+    return "?"
+
+
+class SlowQueryListener(monitoring.CommandListener):
+    def __init__(self, threshold_ms: float, size: int, log_path: str = None):
+        self.threshold_ms = threshold_ms
+        self.log_path = log_path
+        self.records = deque(maxlen=size)
+        self._pending = {}  # (connection, request id) -> (command, route)
+        self._ids = itertools.count(1)
+        self._log_lock = threading.Lock()
+
+    def started(self, event):
+        if event.command_name in COMMANDS:
+            scope = current_scope.get()
+            route = scope.get("route") if scope else None
+            self._pending[(event.connection_id, event.request_id)] = (
+                event.command,
+                route.path if route else None,
+            )
+
+    def succeeded(self, event):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None or event.duration_micros < self.threshold_ms * 1000:
+            return
+        command, route = pending
+        batch = (event.reply.get("cursor") or {}).get("firstBatch")
+        self._record(event, command, route, returned=len(batch) if batch is not None else None)
+
+    def failed(self, event):
+        self._pending.pop((event.connection_id, event.request_id), None)
+
+    def _record(self, event, command, route, returned):
+        query = {k: v for k, v in command.items() if k not in DRIVER_FIELDS}
+        record = {
+            "id": next(self._ids),
+            "at": datetime.now(timezone.utc).isoformat(),
+            "database": event.database_name,
+            "collection": command.get(event.command_name),
+            "command": event.command_name,
+            "route": route,
+            "duration_ms": round(event.duration_micros / 1000, 2),
+            "returned_first_batch": returned,
+            "shape": shape({k: v for k, v in query.items() if k != event.command_name}),
+            # Kept for explain only; never listed, it may hold user data
+            "_query": query,
+        }
+        self.records.append(record)
+        if self.log_path:
+            line = json.dumps(public(record), default=str)
+            with self._log_lock, open(self.log_path, "a") as f:
+                f.write(line + "\n")
+
+    def find(self, record_id: int):
+        return next((r for r in self.records if r["id"] == record_id), None)
+
+
+def public(record: dict) -> dict:
+    return {k: v for k, v in record.items() if not k.startswith("_")}
+
+
+def _first(tree, key):
+    # First value stored under `key` anywhere in a nested explain document
+    if isinstance(tree, dict):
+        if key in tree:
+            return tree[key]
+        tree = list(tree.values())
+    if isinstance(tree, list):
+        for item in tree:
+            found = _first(item, key)
+            if found is not None:
+                return found
+    return None
+
+
+def writes(record: dict) -> bool:
+    pipeline = record["_query"].get("pipeline") or []
+    return any("$out" in stage or "$merge" in stage for stage in pipeline)
+
+
+async def explain(database, record: dict) -> dict:
+    """Re-run a recorded query under explain("executionStats"); the query
+    executes again, so this costs about as much as the original."""
+    started = time.perf_counter()
+    result = await database.command(
+        {"explain": record["_query"], "verbosity": "executionStats"}
+    )
+    stats = _first(result, "executionStats") or {}
+    return {
+        **public(record),
+        "explain_ms": round((time.perf_counter() - started) * 1000, 2),
+        "docs_examined": stats.get("totalDocsExamined"),
+        "keys_examined": stats.get("totalKeysExamined"),
+        "returned": stats.get("nReturned"),
+        "execution_ms": stats.get("executionTimeMillis"),
+        "winning_plan": _first(result, "winningPlan"),
+    }
+
+
+listener = SlowQueryListener(SLOW_QUERY_MS, SLOW_QUERY_BUFFER, SLOW_QUERY_LOG)
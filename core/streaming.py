@@ -0,0 +1,37 @@
+import json
+import os
+
+from dotenv import load_dotenv
+from fastapi.responses import StreamingResponse
+
+load_dotenv()
+
+# Opt-in streaming for endpoints with large results: with ?format=ndjson they
+# return one flat JSON object per line straight from the Motor cursor instead
+# of building the grouped chart payload in memory. Streamed responses bypass
+# the response cache (see core/cache.py).
+NDJSON = "ndjson"
+# Documents per cursor batch fetched from MongoDB while streaming
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "1000"))
+STREAM_CHUNK_ROWS = 200
+
+
+def streamed(kwargs: dict) -> bool:
+    return kwargs.get("response_format") == NDJSON
+
+
+async def _lines(rows):
+    # Rows are written in chunks: one body message per row is needlessly slow
+    chunk = []
+    async for row in rows:
+        chunk.append(json.dumps(row, default=str, separators=(",", ":")))
+        if len(chunk) >= STREAM_CHUNK_ROWS:
+            yield "\n".join(chunk) + "\n"
+            chunk = []
+    if chunk:
+        yield "\n".join(chunk) + "\n"
+
+
+def ndjson_response(rows) -> StreamingResponse:
+    """Stream an async iterable of dicts as newline-delimited JSON."""
+    return StreamingResponse(_lines(rows), media_type="application/x-ndjson")
@@ -0,0 +1,18 @@
+from typing import get_args
+
+from models.schemas import GHGSectorSubmission
+
+# User profile fields copied onto every ghg_submissions document so analytics
+# pipelines can filter and group without a $lookup into users.
+GEO_FIELDS = ("region", "city", "community_type")
+
+
+def user_geo(user: dict) -> dict:
+    return {field: user.get(field) for field in GEO_FIELDS}
+
+
+# Every field a ghg_submissions document can hold, except user_id
+SUBMISSION_FIELDS = frozenset(
+    {"_id", *GEO_FIELDS, "created_at", "updated_at", "estimated_co2e_kg"}
+    | {name for model in get_args(GHGSectorSubmission) for name in model.model_fields}
+)
@@ -0,0 +1,102 @@
+import os
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", "60"))
+TOKEN_CACHE_NEGATIVE_TTL = float(os.getenv("TOKEN_CACHE_NEGATIVE_TTL", "30"))
+
+MISS = object()
+INVALID = object()
+
+
+class TokenCache:
+    """Bounded LRU + TTL map from bearer token to user document.
+
+    Tokens that were looked up and found invalid are remembered separately
+    (with their own bound) so a flood of random tokens cannot evict real
+    sessions. Entries are per process: an invalidation only reaches the
+    worker that performed it, other workers see the change within the TTL.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, negative_ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._users = OrderedDict()  # token -> (expires_at, user)
+        self._invalid = OrderedDict()  # token -> expires_at
+        self._tokens_by_username = {}
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, token: str):
+        now = time.monotonic()
+        entry = self._users.get(token)
+        if entry is not None:
+            if entry[0] > now:
+                self._users.move_to_end(token)
+                self.hits += 1
+                return dict(entry[1])
+            self._drop(token)
+
+        expires_at = self._invalid.get(token)
+        if expires_at is not None:
+            if expires_at > now:
+                self.negative_hits += 1
+                return INVALID
+            del self._invalid[token]
+
+        self.misses += 1
+        return MISS
+
+    def set(self, token: str, user: dict):
+        self._invalid.pop(token, None)
+        if token in self._users:
+            self._drop(token)
+        self._users[token] = (time.monotonic() + self.ttl, dict(user))
+        self._tokens_by_username.setdefault(user["username"], set()).add(token)
+        while len(self._users) > self.maxsize:
+            self._drop(next(iter(self._users)))
+            self.evictions += 1
+
+    def set_invalid(self, token: str):
+        self._invalid[token] = time.monotonic() + self.negative_ttl
+        self._invalid.move_to_end(token)
+        while len(self._invalid) > self.maxsize:
+            self._invalid.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate_user(self, username: str):
+        for token in list(self._tokens_by_username.get(username, ())):
+            self._drop(token)
+
+    def _drop(self, token: str):
+        _, user = self._users.pop(token)
+        tokens = self._tokens_by_username.get(user["username"])
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_username[user["username"]]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "size": len(self._users),
+            "invalid_size": len(self._invalid),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round((self.hits + self.negative_hits) / lookups, 4)
+            if lookups
+            else 0.0,
+        }
+
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL, TOKEN_CACHE_NEGATIVE_TTL)
@@ -0,0 +1,121 @@
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Literal, Optional
+
+from fastapi import HTTPException, Query
+
+# Time bucketing shared by the trend endpoints: optional date range pushed
+# into the leading $match, $dateTrunc buckets of the requested granularity,
+# and optional server-side gap filling with $densify.
+Granularity = Literal["day", "week", "month", "quarter", "year"]
+START_OF_WEEK = "monday"
+
+
+@dataclass
+class TrendParams:
+    """Query parameters of the trend endpoints, used as a dependency.
+
+    A dataclass so its repr (and therefore the response-cache key) reflects
+    the parameter values.
+    """
+
+    granularity: Granularity = Query(default="day")
+    date_from: Optional[date] = Query(default=None, alias="from")
+    date_to: Optional[date] = Query(default=None, alias="to")
+    fill: bool = Query(default=False, description="Fill empty buckets with 0")
+
+    def __post_init__(self):
+        if self.date_from and self.date_to and self.date_from > self.date_to:
+            raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+
+
+def truncate(day: date, unit: str) -> datetime:
+    # Python counterpart of $dateTrunc for the granularities above
+    moment = datetime(day.year, day.month, day.day)
+    if unit == "week":
+        return moment - timedelta(days=moment.weekday())
+    if unit == "month":
+        return moment.replace(day=1)
+    if unit == "quarter":
+        return moment.replace(month=(moment.month - 1) // 3 * 3 + 1, day=1)
+    if unit == "year":
+        return moment.replace(month=1, day=1)
+    return moment
+
+
+def date_range(date_from: Optional[date], date_to: Optional[date]) -> dict:
+    # `to` is inclusive: everything before the start of the following day
+    condition = {}
+    if date_from:
+        condition["$gte"] = truncate(date_from, "day")
+    if date_to:
+        condition["$lt"] = truncate(date_to, "day") + timedelta(days=1)
+    return condition
+
+
+def trend_pipeline(
+    params: TrendParams,
+    date_field: str,
+    values: dict,
+    series: Optional[str] = None,
+    match: Optional[dict] = None,
+) -> list:
+    """Aggregation summing `values` ({output name: expression}) per time
+    bucket of `date_field`, and per `series` field when given.
+
+    Rows come out sorted by date as {"date": "YYYY-MM-DD" (bucket start),
+    series: ..., **values}.
+    """
+    match = dict(match or {})
+    dates = date_range(params.date_from, params.date_to)
+    if dates:
+        match[date_field] = dates
+
+    bucket = {"$dateTrunc": {"date": f"${date_field}", "unit": params.granularity}}
+    if params.granularity == "week":
+        bucket["$dateTrunc"]["startOfWeek"] = START_OF_WEEK
+    group_id = {"bucket": bucket}
+    if series:
+        group_id[series] = f"${series}"
+
+    pipeline = [
+        *([{"$match": match}] if match else []),
+        {"$group": {"_id": group_id, **{name: {"$sum": expr} for name, expr in values.items()}}},
+        {
+            "$project": {
+                "_id": 0,
+                "bucket": "$_id.bucket",
+                **({series: f"$_id.{series}"} if series else {}),
+                **{name: 1 for name in values},
+            }
+        },
+    ]
+    if params.fill:
+        if params.date_from and params.date_to:
+            bounds = [
+                truncate(params.date_from, params.granularity),
+                match[date_field]["$lt"],
+            ]
+        else:
+            bounds = "full"
+        pipeline.append(
+            {
+                "$densify": {
+                    "field": "bucket",
+                    "partitionByFields": [series] if series else [],
+                    "range": {"step": 1, "unit": params.granularity, "bounds": bounds},
+                }
+            }
+        )
+    pipeline += [
+        {"$sort": {"bucket": 1}},
+        {
+            "$project": {
+                "date": {"$dateToString": {"format": "%Y-%m-%d", "date": "$bucket"}},
+                **({series: 1} if series else {}),
+                # Buckets added by $densify carry no values
+                **{name: {"$ifNull": [f"${name}", 0]} for name in values},
+            }
+        },
+    ]
+    return pipeline
@@ -0,0 +1,182 @@
+import asyncio
+import math
+
+from pymongo import DeleteOne, ReplaceOne, ReturnDocument, UpdateOne
+
+from core.db import db
+from core.sketch import bucket_increments
+from core.submissions import GEO_FIELDS
+
+# ghg_user_totals holds one document per (user_id, sector) with the user's
+# summed emissions, submission count and geography. ghg_sketches holds one
+# document per sector: the number of users with a total in that sector, the
+# sum of those totals and a quantile sketch of them (core/sketch.py), so the
+# national average and a user's percentile rank need no scan over users.
+
+
+def _merge(docs) -> dict:
+    merged = {}
+    for doc in docs:
+        row = merged.setdefault(
+            (doc["user_id"], doc["sector"]),
+            {"geo": {field: doc.get(field) for field in GEO_FIELDS}, "total": 0.0, "count": 0},
+        )
+        row["total"] += doc["estimated_co2e_kg"]
+        row["count"] += 1
+    return merged
+
+
+def _sketch_updates(changes_by_sector: dict) -> list:
+    # changes_by_sector: sector -> [(old_total, new_total, amount)]
+    updates = []
+    for sector, changes in changes_by_sector.items():
+        inc = {
+            "count": sum((old is None) - (new is None) for old, new, _ in changes),
+            "sum": sum(amount for _, _, amount in changes),
+        }
+        for key, count in bucket_increments(
+            (old, new) for old, new, _ in changes
+        ).items():
+            inc[f"buckets.{key}"] = count
+        updates.append(UpdateOne({"_id": sector}, {"$inc": inc}, upsert=True))
+    return updates
+
+
+async def record_submissions(docs):
+    merged = _merge(docs)
+    if not merged:
+        return
+    # One atomic $inc per (user, sector), returning the previous total so the
+    # sketch can move the user from the old bucket to the new one
+    before = await asyncio.gather(
+        *(
+            db.ghg_user_totals.find_one_and_update(
+                {"user_id": user_id, "sector": sector},
+                {"$inc": {"total": row["total"], "count": row["count"]}, "$set": row["geo"]},
+                projection={"total": 1},
+                upsert=True,
+                return_document=ReturnDocument.BEFORE,
+            )
+            for (user_id, sector), row in merged.items()
+        )
+    )
+
+    changes = {}
+    for ((_, sector), row), previous in zip(merged.items(), before):
+        old = previous["total"] if previous else None
+        new = (old or 0.0) + row["total"]
+        changes.setdefault(sector, []).append((old, new, row["total"]))
+    await db.ghg_sketches.bulk_write(_sketch_updates(changes), ordered=False)
+
+
+async def move_user(user_id, new_geo: dict):
+    await db.ghg_user_totals.update_many({"user_id": user_id}, {"$set": new_geo})
+
+
+async def remove_user(user_id):
+    rows = await db.ghg_user_totals.find({"user_id": user_id}).to_list(None)
+    if not rows:
+        return
+    await db.ghg_user_totals.delete_many({"user_id": user_id})
+    changes = {}
+    for row in rows:
+        changes.setdefault(row["sector"], []).append((row["total"], None, -row["total"]))
+    await db.ghg_sketches.bulk_write(_sketch_updates(changes), ordered=False)
+
+
+def raw_totals_pipeline() -> list:
+    # The same rows as ghg_user_totals, computed from raw submissions
+    return [
+        {
+            "$group": {
+                "_id": {"user_id": "$user_id", "sector": "$sector"},
+                "total": {"$sum": "$estimated_co2e_kg"},
+                "count": {"$sum": 1},
+                **{field: {"$last": f"${field}"} for field in GEO_FIELDS},
+            }
+        },
+        {
+            "$project": {
+                "_id": 0,
+                "user_id": "$_id.user_id",
+                "sector": "$_id.sector",
+                "total": 1,
+                "count": 1,
+                **{field: 1 for field in GEO_FIELDS},
+            }
+        },
+    ]
+
+
+async def _sketches_from_totals() -> dict:
+    sketches = {}
+    async for row in db.ghg_user_totals.find({}, {"sector": 1, "total": 1}):
+        sketch = sketches.setdefault(
+            row["sector"], {"_id": row["sector"], "count": 0, "sum": 0.0, "buckets": {}}
+        )
+        sketch["count"] += 1
+        sketch["sum"] += row["total"]
+        for key, count in bucket_increments([(None, row["total"])]).items():
+            sketch["buckets"][key] = sketch["buckets"].get(key, 0) + count
+    return sketches
+
+
+async def rebuild():
+    # Same caveat as rollups.rebuild(): increments made while this runs are
+    # lost, so run it during a quiet period or follow it with verify()
+    await db.ghg_submissions.aggregate(
+        raw_totals_pipeline() + [{"$out": "ghg_user_totals"}], allowDiskUse=True
+    ).to_list(None)
+
+    sketches = await _sketches_from_totals()
+    existing = await db.ghg_sketches.distinct("_id")
+    updates = [ReplaceOne({"_id": s}, doc, upsert=True) for s, doc in sketches.items()]
+    updates += [DeleteOne({"_id": s}) for s in existing if s not in sketches]
+    if updates:
+        await db.ghg_sketches.bulk_write(updates, ordered=False)
+
+
+async def verify(tolerance: float = 0.01) -> list:
+    """Compare ghg_user_totals against raw submissions and ghg_sketches
+    against the stored totals.
+
+    Returns mismatches as (key, expected, actual) tuples.
+    """
+    mismatches = []
+
+    expected = {
+        (r["user_id"], r["sector"]): (r["total"], r["count"])
+        for r in await db.ghg_submissions.aggregate(
+            raw_totals_pipeline(), allowDiskUse=True
+        ).to_list(None)
+    }
+    actual = {
+        (r["user_id"], r["sector"]): (r["total"], r["count"])
+        async for r in db.ghg_user_totals.find({}, {"user_id": 1, "sector": 1, "total": 1, "count": 1})
+    }
+    for key in expected.keys() | actual.keys():
+        want, got = expected.get(key), actual.get(key)
+        if (
+            want is None
+            or got is None
+            or want[1] != got[1]
+            or not math.isclose(want[0], got[0], abs_tol=tolerance)
+        ):
+            mismatches.append((key, want, got))
+
+    expected = await _sketches_from_totals()
+    actual = {s["_id"]: s async for s in db.ghg_sketches.find()}
+    for sector in expected.keys() | actual.keys():
+        want, got = expected.get(sector), actual.get(sector)
+        if want is not None and got is not None:
+            buckets = {k: v for k, v in got.get("buckets", {}).items() if v}
+            if (
+                want["count"] == got["count"]
+                and want["buckets"] == buckets
+                and math.isclose(want["sum"], got["sum"], rel_tol=1e-9, abs_tol=tolerance)
+            ):
+                continue
+        if want is None and got is not None and got["count"] == 0:
+            continue
+        mismatches.append((f"sketch:{sector}", want and want["count"], got and got["count"]))
+    return mismatches
@@ -0,0 +1,144 @@
+from datetime import timedelta
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from core.db import db
+
+# submission_windows holds one document per (user_id, scope) with the time of
+# the last accepted submission in that scope: a sector name for GHG
+# submissions, LLM_SCOPE for summary interpretations. Taking a window is one
+# conditional upsert against the unique (user_id, scope) index: it matches
+# when the last submission is old enough, inserts when there is none, and
+# fails with a duplicate key error otherwise, so concurrent requests cannot
+# both pass the once-per-period check.
+WAITING_PERIOD = timedelta(days=7)
+LLM_ENDPOINT = "my-summary-interpret"
+LLM_SCOPE = f"llm:{LLM_ENDPOINT}"
+DUPLICATE_KEY = 11000
+
+
+async def last_times(pairs) -> dict:
+    """last_at of each (user_id, scope) pair that has a window."""
+    pairs = set(pairs)
+    if not pairs:
+        return {}
+    query = {"$or": [{"user_id": user_id, "scope": scope} for user_id, scope in pairs]}
+    return {
+        (doc["user_id"], doc["scope"]): doc["last_at"]
+        async for doc in db.submission_windows.find(query)
+    }
+
+
+async def claim(pairs, now, period: timedelta = WAITING_PERIOD) -> dict:
+    """Take the window of every (user_id, scope) pair at `now`.
+
+    Pairs must be distinct. Returns {pair: last_at} for the pairs refused
+    because their previous submission is less than `period` old.
+    """
+    pairs = list(pairs)
+    if not pairs:
+        return {}
+    try:
+        await db.submission_windows.bulk_write(
+            [
+                UpdateOne(
+                    {"user_id": user_id, "scope": scope, "last_at": {"$lte": now - period}},
+                    {"$set": {"last_at": now}},
+                    upsert=True,
+                )
+                for user_id, scope in pairs
+            ],
+            ordered=False,
+        )
+    except BulkWriteError as e:
+        errors = e.details["writeErrors"]
+        if any(error["code"] != DUPLICATE_KEY for error in errors):
+            raise
+        refused = [pairs[error["index"]] for error in errors]
+        # The refusal message needs the time the window opened
+        times = await last_times(refused)
+        return {pair: times.get(pair, now) for pair in refused}
+    return {}
+
+
+async def _latest_source_time(user_id, scope):
+    if scope == LLM_SCOPE:
+        doc = await db.llm_requests.find_one(
+            {"user_id": user_id, "endpoint": LLM_ENDPOINT},
+            sort=[("requested_at", -1)],
+        )
+        return doc and doc["requested_at"]
+    doc = await db.ghg_submissions.find_one(
+        {"user_id": user_id, "sector": scope}, sort=[("created_at", -1)]
+    )
+    return doc and doc["created_at"]
+
+
+async def release(pairs, now):
+    """Undo claim(pairs, now) for submissions that were not stored after
+    all: each window goes back to the last stored submission, or away."""
+    for user_id, scope in pairs:
+        previous = await _latest_source_time(user_id, scope)
+        mine = {"user_id": user_id, "scope": scope, "last_at": now}
+        if previous is None:
+            await db.submission_windows.delete_one(mine)
+        else:
+            await db.submission_windows.update_one(mine, {"$set": {"last_at": previous}})
+
+
+async def remove_user(user_id):
+    await db.submission_windows.delete_many({"user_id": user_id})
+
+
+def raw_windows_pipeline() -> list:
+    # The same documents as submission_windows, computed from raw submissions
+    # and the llm_requests log
+    return [
+        {"$group": {"_id": {"user_id": "$user_id", "scope": "$sector"}, "last_at": {"$max": "$created_at"}}},
+        {
+            "$unionWith": {
+                "coll": "llm_requests",
+                "pipeline": [
+                    {"$match": {"endpoint": LLM_ENDPOINT}},
+                    {
+                        "$group": {
+                            "_id": {"user_id": "$user_id", "scope": LLM_SCOPE},
+                            "last_at": {"$max": "$requested_at"},
+                        }
+                    },
+                ],
+            }
+        },
+        {"$project": {"_id": 0, "user_id": "$_id.user_id", "scope": "$_id.scope", "last_at": 1}},
+    ]
+
+
+async def rebuild():
+    # Same caveat as rollups.rebuild(): windows taken while this runs are
+    # lost, so run it during a quiet period or follow it with verify()
+    await db.ghg_submissions.aggregate(
+        raw_windows_pipeline() + [{"$out": "submission_windows"}], allowDiskUse=True
+    ).to_list(None)
+
+
+async def verify() -> list:
+    """Compare submission_windows against raw submissions and llm_requests.
+
+    Returns mismatches as ((user_id, scope), expected, actual) tuples.
+    """
+    expected = {
+        (r["user_id"], r["scope"]): r["last_at"]
+        for r in await db.ghg_submissions.aggregate(
+            raw_windows_pipeline(), allowDiskUse=True
+        ).to_list(None)
+    }
+    actual = {
+        (r["user_id"], r["scope"]): r["last_at"]
+        async for r in db.submission_windows.find()
+    }
+    return [
+        (key, expected.get(key), actual.get(key))
+        for key in expected.keys() | actual.keys()
+        if expected.get(key) != actual.get(key)
+    ]
@@ -20,6 +20,7 @@ echo "🔹 Installing packages..."
 pip install \
 annotated-types \
 anyio \
+async-timeout \
 autopep8 \
 bcrypt \
 certifi \
@@ -33,7 +34,9 @@ filelock \
 fsspec \
 h11 \
 hf-xet \
+httpcore \
 httptools \
+httpx \
 huggingface-hub \
 idna \
 Jinja2 \
@@ -42,8 +45,10 @@ motor \
 mpmath \
 networkx \
 numpy \
+orjson \
 packaging \
 pendulum \
+prometheus-client \
 pycodestyle \
 pydantic \
 pydantic_core \
@@ -51,6 +56,7 @@ pymongo \
 python-dateutil \
 python-dotenv \
 PyYAML \
+redis \
 regex \
 requests \
 safetensors \
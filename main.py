@@ -1,14 +1,18 @@
 import os
 import json
 from dotenv import load_dotenv
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi_cache import FastAPICache
-from fastapi_cache.backends.inmemory import InMemoryBackend
 from contextlib import asynccontextmanager
 
+from core import llm_jobs
+from core.cache_backends import CACHE_NAMESPACE, backend_from_env
+from core.indexes import ensure_indexes
+from core.metrics import MetricsMiddleware, metrics_response
 from routes.auth import router as auth_router
-from routes import ghg
+from routes import ghg, ops
+from routes.ops import require_ops_token
 
 load_dotenv()
 
@@ -18,9 +22,14 @@ load_dotenv()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    FastAPICache.init(InMemoryBackend(), prefix="fastapi-cache")
+    # CACHE_BACKEND selects a per-worker or a shared cache, see core/cache_backends.py
+    FastAPICache.init(await backend_from_env(), prefix=CACHE_NAMESPACE)
+    await ensure_indexes()
+    # Interpretation workers, LLM_BACKEND selects the model (core/llm.py)
+    await llm_jobs.start()
     yield
     # Shutdown
+    await llm_jobs.stop()
 
 
 # Create app with lifespan
@@ -37,7 +46,17 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost, so request timings include the other middleware
+app.add_middleware(MetricsMiddleware)
 
 # Include routes
 app.include_router(auth_router, prefix="/api")
 app.include_router(ghg.router, prefix="/api/ghg", tags=["GHG"])
+app.include_router(ops.router, prefix="/api/ops", tags=["Ops"])
+# Prometheus scrape endpoint, behind the same X-Ops-Token as /api/ops
+app.add_api_route(
+    "/metrics",
+    metrics_response,
+    dependencies=[Depends(require_ops_token)],
+    include_in_schema=False,
+)
@@ -166,12 +166,26 @@ class GHGSubmissionIPPU(BaseModel):
 
 
 # Union of all sector submissions
-GHGSubmission = Optional[
-    Union[
-        GHGSubmissionEnergy,
-        GHGSubmissionTransport,
-        GHGSubmissionWaste,
-        GHGSubmissionAgriculture,
-        GHGSubmissionIPPU,
-    ]
+GHGSectorSubmission = Union[
+    GHGSubmissionEnergy,
+    GHGSubmissionTransport,
+    GHGSubmissionWaste,
+    GHGSubmissionAgriculture,
+    GHGSubmissionIPPU,
 ]
+GHGSubmission = Optional[GHGSectorSubmission]
+
+
+# --- Batch Submission Models ---
+MAX_BATCH_SIZE = 500
+
+
+class GHGBatchItem(BaseModel):
+    # Defaults to the submitting user; other users need a delegation granted
+    # by an operator (core/delegations.py)
+    user_id: Optional[str] = None
+    submission: GHGSectorSubmission
+
+
+class GHGBatchSubmission(BaseModel):
+    items: List[GHGBatchItem] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
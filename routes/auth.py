@@ -2,11 +2,15 @@ from fastapi import APIRouter, HTTPException, Request, Depends
 from bson.objectid import ObjectId
 from datetime import datetime, timezone
 from uuid import uuid4
-from fastapi_cache import FastAPICache
+from pymongo import ReturnDocument
 
+from core.cache import GLOBAL, invalidate, region_tag, user_tag
 from core.db import db
+from core import delegations, generation, leaderboard, rollups, user_totals, windows
+from core.submissions import GEO_FIELDS, user_geo
+from core.token_cache import INVALID, MISS, token_cache
 from models.schemas import *
-from utils.security import hash_password, verify_password
+from utils.security import hash_password_async, verify_password_async
 
 router = APIRouter()
 
@@ -16,12 +20,19 @@ async def get_current_user(request: Request):
     if not token or not token.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid token format")
     token_value = token.split(" ")[1]
+    cached = token_cache.get(token_value)
+    if cached is INVALID:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if cached is not MISS:
+        return cached
     token_doc = await db.tokens.find_one({"token": token_value})
     if not token_doc:
+        token_cache.set_invalid(token_value)
         raise HTTPException(status_code=401, detail="Invalid token")
     user = await db.users.find_one({"username": token_doc["username"]})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    token_cache.set(token_value, user)
     return user
 
 
@@ -30,7 +41,7 @@ async def register(user: UserRegistration):
     if await db.users.find_one({"username": user.username}):
         raise HTTPException(status_code=400, detail="Username already exists")
     doc = user.dict(exclude={"password"})
-    doc["password"] = hash_password(user.password)
+    doc["password"] = await hash_password_async(user.password)
     doc["created_at"] = doc["updated_at"] = datetime.now(timezone.utc)
     result = await db.users.insert_one(doc)
     new_user = await db.users.find_one({"_id": result.inserted_id})
@@ -52,13 +63,9 @@ async def register(user: UserRegistration):
 @router.post("/login", response_model=TokenResponse)
 async def login(data: UserLogin):
     user = await db.users.find_one({"username": data.username})
-    if not user or not verify_password(data.password, user["password"]):
+    if not user or not await verify_password_async(data.password, user["password"]):
         raise HTTPException(status_code=401, detail="Invalid username or password")
 
-    # Invalidate all cached data
-    if FastAPICache.get_backend():
-        await FastAPICache.clear()
-
     token = str(uuid4())
     await db.tokens.insert_one({"token": token, "username": data.username})
     return TokenResponse(
@@ -97,11 +104,37 @@ async def update_user(
     fields = {k: v for k, v in update.dict(exclude_unset=True).items()}
     fields["updated_at"] = datetime.now(timezone.utc)
 
-    await db.users.update_one({"_id": ObjectId(user_id)}, {"$set": fields})
+    # The profile as it was just before this update, not current_user: that
+    # may be another worker's token cache copy from before an earlier change
+    before = await db.users.find_one_and_update(
+        {"_id": ObjectId(user_id)},
+        {"$set": fields},
+        return_document=ReturnDocument.BEFORE,
+    )
+    token_cache.invalidate_user(current_user["username"])
+    if before is None:
+        raise HTTPException(status_code=404, detail="User not found")
 
-    # Invalidate all cached data
-    if FastAPICache.get_backend():
-        await FastAPICache.clear()
+    await leaderboard.update_profile({**before, **fields})
+
+    # Keep the geography stamped on past submissions in sync with the profile
+    old_geo = user_geo(before)
+    new_geo = {**old_geo, **{k: v for k, v in fields.items() if k in GEO_FIELDS}}
+    if new_geo != old_geo:
+        await db.ghg_submissions.update_many(
+            {"user_id": ObjectId(user_id)}, {"$set": new_geo}
+        )
+        await rollups.move_user(ObjectId(user_id), old_geo, new_geo)
+        await user_totals.move_user(ObjectId(user_id), new_geo)
+
+    # Names and geography appear in national and regional views alike
+    await invalidate(
+        GLOBAL,
+        region_tag(old_geo["region"]),
+        region_tag(new_geo["region"]),
+        user_tag(user_id),
+    )
+    await generation.bump()
 
     return {"message": "User updated successfully"}
 
@@ -112,11 +145,23 @@ async def delete_user(user_id: str, current_user=Depends(get_current_user)):
         raise HTTPException(
             status_code=403, detail="You can only delete your own account"
         )
-    await db.users.delete_one({"_id": ObjectId(user_id)})
+    # The stored profile, not a possibly stale token cache copy, tells which
+    # rollup rows hold the user's submissions
+    deleted = await db.users.find_one_and_delete({"_id": ObjectId(user_id)})
     await db.tokens.delete_many({"username": current_user["username"]})
-
-    # Invalidate all cached data
-    if FastAPICache.get_backend():
-        await FastAPICache.clear()
+    token_cache.invalidate_user(current_user["username"])
+    if deleted is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    # Submissions carry their own geography, so they would otherwise keep
+    # showing up in regional aggregates after the account is gone
+    await rollups.remove_user(ObjectId(user_id), user_geo(deleted))
+    await user_totals.remove_user(ObjectId(user_id))
+    await leaderboard.remove_user(ObjectId(user_id))
+    await windows.remove_user(ObjectId(user_id))
+    await delegations.remove_user(ObjectId(user_id))
+    await db.ghg_submissions.delete_many({"user_id": ObjectId(user_id)})
+
+    await invalidate(GLOBAL, region_tag(deleted.get("region")), user_tag(user_id))
+    await generation.bump()
 
     return {"message": "User deleted successfully"}
@@ -1,170 +1,205 @@
-import os
-from fastapi import APIRouter, Depends, HTTPException, Request, Query, status
-from fastapi.concurrency import run_in_threadpool
-from fastapi_cache import FastAPICache
-from fastapi_cache.decorator import cache
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, Query, status
 from fastapi.responses import JSONResponse
-from typing import List, Optional
-from datetime import datetime, timezone, timedelta
+from typing import List, Literal, Optional
+from datetime import date, datetime, timezone
 from bson.objectid import ObjectId
 from bson.regex import Regex
 
-
-from huggingface_hub import InferenceClient
-
 from routes.auth import get_current_user
-from models.schemas import GHGSubmission
+from models.schemas import GHGBatchSubmission, GHGSubmission
+from core import delegations, export, leaderboard, llm_jobs, pagination, windows
+from core.cache import cached, regions_tags, user_tags
 from core.db import db
+from core.emissions import estimate_co2e, estimate_co2e_batch
+from core.ingest import (
+    current_geo,
+    store_submissions,
+    submission_doc,
+    waiting_period_message,
+)
+from core.sketch import rank_below
+from core.submissions import SUBMISSION_FIELDS
+from core.streaming import NDJSON, STREAM_BATCH_SIZE, ndjson_response
+from core.trends import TrendParams, date_range, trend_pipeline
 
 router = APIRouter()
 
-HF_API_TOKEN = os.getenv("HUGGINGFACEHUB_API_TOKEN")
-HF_MODEL = "mistralai/Mistral-7B-Instruct-v0.2"
-hf_client = InferenceClient(model=HF_MODEL, token=HF_API_TOKEN)
+
+async def submission_owner(current_user: dict) -> dict:
+    # current_user with its geography read fresh (see core.ingest.current_geo)
+    geo = await current_geo(current_user["_id"])
+    if geo is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {**current_user, **geo}
 
 
 @router.post("/submit")
 async def submit(submission: GHGSubmission, current_user=Depends(get_current_user)):
     now = datetime.now(timezone.utc)
-    latest = await db.ghg_submissions.find_one(
-        {"user_id": current_user["_id"], "sector": submission.sector},
-        sort=[("created_at", -1)],
-    )
-    waiting_period = 7 * 24 * 60 * 60  # 7 days in seconds
-
-    if latest:
-        last_time = latest["created_at"]
-        elapsed = (now.replace(tzinfo=None) - last_time).total_seconds()
-        if elapsed < waiting_period:
-            next_allowed = last_time + timedelta(seconds=waiting_period)
-            next_allowed_str = next_allowed.strftime("%Y-%m-%d %H:%M:%S UTC")
-            raise HTTPException(
-                status_code=403,
-                detail=(
-                    f"You can only submit once every 7 days for the {submission.sector} sector. "
-                    f"Your next allowed submission will be on: {next_allowed_str}."
-                ),
-            )
+    owner = await submission_owner(current_user)
+    pair = (current_user["_id"], submission.sector)
+    refused = await windows.claim([pair], now)
+    if refused:
+        raise HTTPException(
+            status_code=403,
+            detail=waiting_period_message(submission.sector, refused[pair]),
+        )
 
-    # Philippine-specific and IPCC Tier 1 emission factors
-    ef = {
-        "electricity": 0.709,
-        "lpg": 2.983,
-        "kerosene": 2.391,
-        "firewood": 0.015,
-        "diesel": 2.68,
-        "gasoline": 2.32,
-        "coal": 2.42,
-        "cng": 2.0,
-        "others": 2.0,
+    data = submission.model_dump()
+    co2e = estimate_co2e(data)
+    doc = submission_doc(data, owner, now, co2e)
+    failed = await store_submissions([doc])
+    if failed:
+        await windows.release([pair], now)
+        raise HTTPException(status_code=500, detail="Failed to store submission")
+    return {
+        "message": f"GHG data submitted for {submission.sector} sector successfully",
+        "id": str(doc["_id"]),
+        "estimated_co2e_kg": co2e,
     }
-    doc = submission.model_dump()
-    co2e = 0.0
-
-    if submission.sector == "energy":
-        co2e += doc.get("electricity_consumed_kwh", 0) * ef["electricity"]
-        co2e += doc.get("lpg_used_kg", 0) * ef["lpg"]
-        co2e += doc.get("kerosene_used_liters", 0) * ef["kerosene"]
-        co2e += doc.get("firewood_used_kg", 0) * ef["firewood"]
-        co2e += doc.get("diesel_used_liters", 0) * ef["diesel"]
-        co2e += doc.get("gasoline_used_liters", 0) * ef["gasoline"]
-        co2e += doc.get("coal_used_kg", 0) * ef["coal"]
-
-    elif submission.sector == "transport":
-        vehicles = doc.get("number_of_vehicles", 0)
-        distance = doc.get("distance_travelled_daily_km", 0)
-        freq = doc.get("travel_frequency_per_week", 0)
-        trips = doc.get("trips_per_day", 0)
-        fuel_type = doc.get("fuel_type", "diesel").lower()
-        fuel_ef = ef.get(fuel_type, 2.0)
-        co2e = vehicles * distance * freq * trips * fuel_ef
-
-    elif submission.sector == "waste":
-        waste = doc.get("waste_generated_kg_per_month", 0)
-        organic = doc.get("organic_fraction_percent", 0)
-        method = doc.get("waste_disposal_method", "landfill")
-        methane_capture = doc.get("methane_capture", False)
-        waste_ef = {
-            "landfill": 1.8,
-            "open_dumping": 2.0,
-            "composting": 0.2,
-            "recycling": 0.0,
-            "incineration": 2.0,
-            "others": 1.0,
-        }
-        base_ef = waste_ef.get(method, 1.0)
-        if methane_capture and method == "landfill":
-            base_ef *= 0.5  # 50% reduction for methane capture
-        co2e = waste * (organic / 100.0) * base_ef
-
-    elif submission.sector == "agriculture":
-        co2e = (
-            doc.get("number_of_cattle", 0) * 912.5
-            + doc.get("number_of_carabao", 0) * 730
-            + doc.get("number_of_goats", 0) * 182.5
-            + doc.get("number_of_pigs", 0) * 401.5
-            + doc.get("number_of_chickens", 0) * 7.3
-            + doc.get("fertilizer_applied_kg", 0) * 5.5
+
+
+# POST /api/ghg/submit-batch
+# Purpose: Ingest many sector submissions at once, e.g. an LGU office entering
+# data for the barangays it has been delegated (core/delegations.py). Items
+# are validated in one pass (one bulk write for the 7-day rule), inserted with
+# a single unordered insert_many, and reported individually.
+@router.post("/submit-batch")
+async def submit_batch(
+    batch: GHGBatchSubmission, current_user=Depends(get_current_user)
+):
+    now = datetime.now(timezone.utc)
+    items = batch.items
+    results = [None] * len(items)
+
+    def reject(i, detail):
+        results[i] = {"index": i, "status": "rejected", "detail": detail}
+
+    other_ids = {
+        ObjectId(item.user_id)
+        for item in items
+        if item.user_id and ObjectId.is_valid(item.user_id)
+    } - {current_user["_id"]}
+    permitted = await delegations.allowed(current_user["_id"], other_ids)
+    # Owners are read fresh from users, so their geography is current
+    users = {current_user["_id"]: await submission_owner(current_user)}
+    if permitted:
+        async for user in db.users.find({"_id": {"$in": list(permitted)}}):
+            users[user["_id"]] = user
+
+    owners = [None] * len(items)
+    for i, item in enumerate(items):
+        if item.user_id is None:
+            owners[i] = users[current_user["_id"]]
+        elif not ObjectId.is_valid(item.user_id):
+            reject(i, "Invalid user_id")
+        elif ObjectId(item.user_id) == current_user["_id"]:
+            owners[i] = users[current_user["_id"]]
+        elif ObjectId(item.user_id) not in permitted:
+            reject(i, "Not allowed to submit for this user")
+        elif ObjectId(item.user_id) not in users:
+            reject(i, "User not found")
+        else:
+            owners[i] = users[ObjectId(item.user_id)]
+
+    candidates = {}
+    for i, (owner, item) in enumerate(zip(owners, items)):
+        if owner is None:
+            continue
+        sector = item.submission.sector
+        pair = (owner["_id"], sector)
+        if pair in candidates:
+            reject(i, f"Duplicate {sector} submission for this user in this batch")
+        else:
+            candidates[pair] = i
+
+    refused = await windows.claim(candidates, now)
+    accepted = []
+    for pair, i in candidates.items():
+        if pair in refused:
+            reject(i, waiting_period_message(pair[1], refused[pair]))
+        else:
+            accepted.append(i)
+    accepted.sort()
+
+    data = [items[i].submission.model_dump() for i in accepted]
+    docs = [
+        submission_doc(d, owners[i], now, co2e)
+        for i, d, co2e in zip(accepted, data, estimate_co2e_batch(data))
+    ]
+    failed = await store_submissions(docs) if docs else set()
+    if failed:
+        await windows.release(
+            [(docs[n]["user_id"], docs[n]["sector"]) for n in failed], now
         )
-        if doc.get("rice_paddy_area_hectares", 0) > 0:
-            water_mgmt = doc.get("rice_water_management", "continuous_flooding")
-            rice_ef = {
-                "continuous_flooding": 1200,
-                "intermittent_flooding": 800,
-                "dry_cultivation": 100,
+    for n, (i, doc) in enumerate(zip(accepted, docs)):
+        if n in failed:
+            reject(i, "Failed to store submission")
+        else:
+            results[i] = {
+                "index": i,
+                "status": "created",
+                "id": str(doc["_id"]),
+                "sector": doc["sector"],
+                "estimated_co2e_kg": doc["estimated_co2e_kg"],
             }
-            co2e += doc["rice_paddy_area_hectares"] * rice_ef.get(water_mgmt, 1200)
-
-    elif submission.sector == "ippu":
-        co2e = (
-            doc.get("cement_produced_tonnes", 0) * 800
-            + doc.get("lime_produced_tonnes", 0) * 900
-            + doc.get("steel_produced_tonnes", 0) * 1800
-            + doc.get("refrigerant_consumed_kg", 0) * 1430
-            + doc.get("solvent_used_liters", 0) * 2.0
-            + doc.get("other_process_emissions_CO2e_tonnes", 0) * 1000
-        )
 
-    doc.update(
-        {
-            "user_id": current_user["_id"],
-            "created_at": now,
-            "updated_at": now,
-            "estimated_co2e_kg": round(co2e, 2),
-        }
-    )
-    result = await db.ghg_submissions.insert_one(doc)
-    await FastAPICache.clear()  # invalidate all cache
+    created = sum(result["status"] == "created" for result in results)
     return {
-        "message": f"GHG data submitted for {submission.sector} sector successfully",
-        "id": str(result.inserted_id),
-        "estimated_co2e_kg": round(co2e, 2),
+        "message": f"{created} of {len(items)} GHG submissions stored",
+        "created": created,
+        "rejected": len(items) - created,
+        "results": results,
     }
 
 
+# Bulk export of raw submissions for offline analysis
+# Streams straight from the cursor (see core/export.py); never cached
+@router.get("/export")
+async def export_submissions(
+    export_format: Literal["csv", "npz"] = Query(default="csv", alias="format"),
+    sector: Optional[Literal["energy", "transport", "waste", "agriculture", "ippu"]] = Query(
+        default=None
+    ),
+    regions: Optional[str] = Query(default=None),
+    date_from: Optional[date] = Query(default=None, alias="from"),
+    date_to: Optional[date] = Query(default=None, alias="to"),
+    current_user=Depends(get_current_user),
+):
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    match = {}
+    if regions:
+        match["region"] = {"$in": regions.split(",")}
+    if sector:
+        match["sector"] = sector
+    dates = date_range(date_from, date_to)
+    if dates:
+        match["created_at"] = dates
+
+    columns = export.columns(sector)
+    cursor = db.ghg_submissions.find(
+        match,
+        {name: 1 for name in columns},
+        batch_size=export.EXPORT_BATCH_SIZE,
+    )
+    return export.export_response(cursor, columns, export_format)
+
+
 @router.get("/community-summary")
-@cache(expire=300)  # 5 minutes
+@cached(expire=300)  # 5 minutes
 async def get_community_summary():
     pipeline = [
-        {
-            "$lookup": {
-                "from": "users",
-                "localField": "user_id",
-                "foreignField": "_id",
-                "as": "user_info",
-            }
-        },
-        {"$unwind": "$user_info"},
         {
             "$group": {
-                "_id": {"region": "$user_info.region", "city": "$user_info.city"},
-                "total_emissions": {"$sum": "$estimated_co2e_kg"},
-                "count": {"$sum": 1},
+                "_id": {"region": "$region", "city": "$city"},
+                "total_emissions": {"$sum": "$total_emissions"},
+                "count": {"$sum": "$count"},
             }
         },
         {"$sort": {"_id.region": 1, "_id.city": 1}},
     ]
-    result = await db.ghg_submissions.aggregate(pipeline).to_list(length=None)
+    result = await db.ghg_rollups.aggregate(pipeline).to_list(length=None)
     return [
         {
             "region": r["_id"].get("region"),
@@ -177,46 +212,34 @@ async def get_community_summary():
 
 
 @router.get("/timeseries")
-@cache(expire=600)
-async def get_timeseries_summary(regions: Optional[str] = Query(default=None)):
+@cached(expire=600, tags=regions_tags)
+async def get_timeseries_summary(
+    regions: Optional[str] = Query(default=None),
+    trend: TrendParams = Depends(),
+    response_format: Literal["json", "ndjson"] = Query(default="json", alias="format"),
+):
     match_stage = {}
     if regions:
         region_list = regions.split(",")
-        match_stage = {"user_info.region": {"$in": region_list}}
+        match_stage = {"region": {"$in": region_list}}
 
-    pipeline = [
-        {
-            "$lookup": {
-                "from": "users",
-                "localField": "user_id",
-                "foreignField": "_id",
-                "as": "user_info",
-            }
-        },
-        {"$unwind": "$user_info"},
-    ]
-    if match_stage:
-        pipeline.append({"$match": match_stage})
-    pipeline += [
-        {
-            "$group": {
-                "_id": {
-                    "date": {
-                        "$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}
-                    }
-                },
-                "total_emissions": {"$sum": "$estimated_co2e_kg"},
-                "count": {"$sum": 1},
-            }
-        },
-        {"$sort": {"_id.date": 1}},
-    ]
-    result = await db.ghg_submissions.aggregate(pipeline).to_list(length=None)
+    pipeline = trend_pipeline(
+        trend,
+        "day",
+        {"total_emissions": "$total_emissions", "count": "$count"},
+        match=match_stage,
+    )
+    if response_format == NDJSON:
+        return ndjson_response(
+            {**r, "total_emissions": round(r["total_emissions"], 2)}
+            async for r in db.ghg_rollups.aggregate(pipeline, batchSize=STREAM_BATCH_SIZE)
+        )
+    result = await db.ghg_rollups.aggregate(pipeline).to_list(length=None)
     return {
-        "labels": [r["_id"]["date"] for r in result],
+        "labels": [r["date"] for r in result],
         "datasets": [
             {
-                "label": "Total CO2e per Day (kg)",
+                "label": f"Total CO2e per {trend.granularity.capitalize()} (kg)",
                 "data": [round(r["total_emissions"], 2) for r in result],
                 "backgroundColor": "rgba(75,192,192,0.4)",
                 "borderColor": "rgba(75,192,192,1)",
@@ -230,37 +253,25 @@ async def get_timeseries_summary(regions: Optional[str] = Query(default=None)):
 # Chart: Compare average emissions per community type
 # Usage: Identify which community types are most polluting on average
 @router.get("/aggregated-by-type")
-@cache(expire=300)
+@cached(expire=300, tags=regions_tags)
 async def aggregated_by_type(regions: Optional[str] = Query(default=None)):
     match_stage = {}
     if regions:
         region_list = regions.split(",")
-        match_stage = {"user_info.region": {"$in": region_list}}
+        match_stage = {"region": {"$in": region_list}}
 
     pipeline = [
-        {
-            "$lookup": {
-                "from": "users",
-                "localField": "user_id",
-                "foreignField": "_id",
-                "as": "user_info",
-            }
-        },
-        {"$unwind": "$user_info"},
-    ]
-    if match_stage:
-        pipeline.append({"$match": match_stage})
-    pipeline += [
+        *([{"$match": match_stage}] if match_stage else []),
         {
             "$group": {
-                "_id": "$user_info.community_type",
-                "total_emissions": {"$sum": "$estimated_co2e_kg"},
-                "count": {"$sum": 1},
+                "_id": "$community_type",
+                "total_emissions": {"$sum": "$total_emissions"},
+                "count": {"$sum": "$count"},
             }
         },
         {"$sort": {"_id": 1}},
     ]
-    result = await db.ghg_submissions.aggregate(pipeline).to_list(None)
+    result = await db.ghg_rollups.aggregate(pipeline).to_list(None)
     return [
         {
             "community_type": r["_id"],
@@ -274,50 +285,40 @@ async def aggregated_by_type(regions: Optional[str] = Query(default=None)):
 # Returns: Emissions over time grouped by region
 # Chart: Stacked or grouped line chart per region
 @router.get("/regional-trend-summary")
-@cache(expire=900)
-async def regional_trend_summary(regions: List[str] = Query(default=None)):
+@cached(expire=900)  # regions are matched partially, so depends on all
+async def regional_trend_summary(
+    regions: List[str] = Query(default=None),
+    trend: TrendParams = Depends(),
+    response_format: Literal["json", "ndjson"] = Query(default="json", alias="format"),
+):
     match_stage = {}
     if regions:
         # Modify the match to use regex for partial matches
-        match_stage["user_info.region"] = {
+        match_stage["region"] = {
             "$in": [Regex(f".*{region}.*", "i") for region in regions]
         }
 
-    pipeline = [
-        {
-            "$lookup": {
-                "from": "users",
-                "localField": "user_id",
-                "foreignField": "_id",
-                "as": "user_info",
-            }
-        },
-        {"$unwind": "$user_info"},
-        *([{"$match": match_stage}] if match_stage else []),
-        {
-            "$group": {
-                "_id": {
-                    "date": {
-                        "$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}
-                    },
-                    "region": "$user_info.region",
-                },
-                "total_emissions": {"$sum": "$estimated_co2e_kg"},
-            }
-        },
-        {"$sort": {"_id.date": 1}},
-    ]
+    pipeline = trend_pipeline(
+        trend,
+        "day",
+        {"total_emissions": "$total_emissions"},
+        series="region",
+        match=match_stage,
+    )
+    if response_format == NDJSON:
+        return ndjson_response(
+            {**r, "total_emissions": round(r["total_emissions"], 2)}
+            async for r in db.ghg_rollups.aggregate(pipeline, batchSize=STREAM_BATCH_SIZE)
+        )
 
-    result = await db.ghg_submissions.aggregate(pipeline).to_list(None)
+    result = await db.ghg_rollups.aggregate(pipeline).to_list(None)
 
     from collections import defaultdict
 
     grouped = defaultdict(lambda: {"labels": [], "data": []})
     for r in result:
-        date = r["_id"]["date"]
-        region = r["_id"]["region"]
-        grouped[region]["labels"].append(date)
-        grouped[region]["data"].append(round(r["total_emissions"], 2))
+        grouped[r["region"]]["labels"].append(r["date"])
+        grouped[r["region"]]["data"].append(round(r["total_emissions"], 2))
 
     return grouped
 
@@ -325,37 +326,39 @@ async def regional_trend_summary(regions: List[str] = Query(default=None)):
 # Returns: Time-series GHG data per sector for a given user
 # Chart: Sectoral trend lines (weekly or monthly) for a specific community
 @router.get("/user-trend/{user_id}")
-async def user_trend(user_id: str):
+@cached(expire=600, tags=user_tags)
+async def user_trend(
+    user_id: str,
+    trend: TrendParams = Depends(),
+    response_format: Literal["json", "ndjson"] = Query(default="json", alias="format"),
+):
     try:
         uid = ObjectId(user_id)
     except:
         raise HTTPException(400, "Invalid ID")
 
-    pipeline = [
-        {"$match": {"user_id": uid}},
-        {
-            "$group": {
-                "_id": {
-                    "date": {
-                        "$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}
-                    },
-                    "sector": "$sector",
-                },
-                "emissions": {"$sum": "$estimated_co2e_kg"},
-            }
-        },
-        {"$sort": {"_id.date": 1}},
-    ]
+    pipeline = trend_pipeline(
+        trend,
+        "created_at",
+        {"emissions": "$estimated_co2e_kg"},
+        series="sector",
+        match={"user_id": uid},
+    )
+    if response_format == NDJSON:
+        return ndjson_response(
+            {**r, "emissions": round(r["emissions"], 2)}
+            async for r in db.ghg_submissions.aggregate(
+                pipeline, batchSize=STREAM_BATCH_SIZE
+            )
+        )
     data = await db.ghg_submissions.aggregate(pipeline).to_list(None)
 
     from collections import defaultdict
 
     output = defaultdict(lambda: {"labels": [], "data": []})
     for r in data:
-        sector = r["_id"]["sector"]
-        date = r["_id"]["date"]
-        output[sector]["labels"].append(date)
-        output[sector]["data"].append(round(r["emissions"], 2))
+        output[r["sector"]]["labels"].append(r["date"])
+        output[r["sector"]]["data"].append(round(r["emissions"], 2))
 
     return output
 
@@ -363,36 +366,24 @@ async def user_trend(user_id: str):
 # Sectoral Emissions by Region or City
 # Purpose: See which sectors dominate emissions in each region or city.
 @router.get("/sectoral-by-region")
-@cache(expire=300)
+@cached(expire=300, tags=regions_tags)
 async def sectoral_by_region(regions: Optional[str] = Query(default=None)):
     match_stage = {}
     if regions:
         region_list = regions.split(",")
-        match_stage = {"user.region": {"$in": region_list}}
+        match_stage = {"region": {"$in": region_list}}
 
     pipeline = [
-        {
-            "$lookup": {
-                "from": "users",
-                "localField": "user_id",
-                "foreignField": "_id",
-                "as": "user",
-            }
-        },
-        {"$unwind": "$user"},
-    ]
-    if match_stage:
-        pipeline.append({"$match": match_stage})
-    pipeline += [
+        *([{"$match": match_stage}] if match_stage else []),
         {
             "$group": {
-                "_id": {"region": "$user.region", "sector": "$sector"},
-                "total_emissions": {"$sum": "$estimated_co2e_kg"},
+                "_id": {"region": "$region", "sector": "$sector"},
+                "total_emissions": {"$sum": "$total_emissions"},
             }
         },
         {"$sort": {"_id.region": 1, "_id.sector": 1}},
     ]
-    result = await db.ghg_submissions.aggregate(pipeline).to_list(None)
+    result = await db.ghg_rollups.aggregate(pipeline).to_list(None)
 
     from collections import defaultdict
 
@@ -408,31 +399,27 @@ async def sectoral_by_region(regions: Optional[str] = Query(default=None)):
 #  Sectoral Trend Over Time (National)
 # Purpose: Analyze which sectors are increasing or decreasing over time
 @router.get("/sectoral-trend")
-@cache(expire=900)
-async def sectoral_trend():
-    pipeline = [
-        {
-            "$group": {
-                "_id": {
-                    "sector": "$sector",
-                    "date": {
-                        "$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}
-                    },
-                },
-                "total_emissions": {"$sum": "$estimated_co2e_kg"},
-            }
-        },
-        {"$sort": {"_id.date": 1}},
-    ]
-    result = await db.ghg_submissions.aggregate(pipeline).to_list(None)
+@cached(expire=900)
+async def sectoral_trend(
+    trend: TrendParams = Depends(),
+    response_format: Literal["json", "ndjson"] = Query(default="json", alias="format"),
+):
+    pipeline = trend_pipeline(
+        trend, "day", {"total_emissions": "$total_emissions"}, series="sector"
+    )
+    if response_format == NDJSON:
+        return ndjson_response(
+            {**r, "total_emissions": round(r["total_emissions"], 2)}
+            async for r in db.ghg_rollups.aggregate(pipeline, batchSize=STREAM_BATCH_SIZE)
+        )
+    result = await db.ghg_rollups.aggregate(pipeline).to_list(None)
 
     from collections import defaultdict
 
     grouped = defaultdict(lambda: {"labels": [], "data": []})
     for r in result:
-        sector = r["_id"]["sector"]
-        grouped[sector]["labels"].append(r["_id"]["date"])
-        grouped[sector]["data"].append(round(r["total_emissions"], 2))
+        grouped[r["sector"]]["labels"].append(r["date"])
+        grouped[r["sector"]]["data"].append(round(r["total_emissions"], 2))
 
     return grouped
 
@@ -440,36 +427,24 @@ async def sectoral_trend():
 # Sectoral Composition by Community Type
 # Purpose: Identify what emissions sectors dominate for schools, barangays, LGUs, etc.
 @router.get("/sectoral-by-community-type")
-@cache(expire=300)
+@cached(expire=300, tags=regions_tags)
 async def sectoral_by_community_type(regions: Optional[str] = Query(default=None)):
     match_stage = {}
     if regions:
         region_list = regions.split(",")
-        match_stage = {"user.region": {"$in": region_list}}
+        match_stage = {"region": {"$in": region_list}}
 
     pipeline = [
-        {
-            "$lookup": {
-                "from": "users",
-                "localField": "user_id",
-                "foreignField": "_id",
-                "as": "user",
-            }
-        },
-        {"$unwind": "$user"},
-    ]
-    if match_stage:
-        pipeline.append({"$match": match_stage})
-    pipeline += [
+        *([{"$match": match_stage}] if match_stage else []),
         {
             "$group": {
-                "_id": {"community_type": "$user.community_type", "sector": "$sector"},
-                "total_emissions": {"$sum": "$estimated_co2e_kg"},
+                "_id": {"community_type": "$community_type", "sector": "$sector"},
+                "total_emissions": {"$sum": "$total_emissions"},
             }
         },
         {"$sort": {"_id.community_type": 1, "_id.sector": 1}},
     ]
-    result = await db.ghg_submissions.aggregate(pipeline).to_list(None)
+    result = await db.ghg_rollups.aggregate(pipeline).to_list(None)
 
     from collections import defaultdict
 
@@ -485,144 +460,114 @@ async def sectoral_by_community_type(regions: Optional[str] = Query(default=None
 # Sector Contribution Ranking (Top Contributors Globally per Sector)
 # Purpose: Who are the top GHG emitters in each sector?
 @router.get("/top-by-sector")
-@cache(expire=600)
-async def top_by_sector(limit: int = 5, regions: Optional[str] = Query(default=None)):
+@cached(expire=600, tags=regions_tags)
+async def top_by_sector(
+    limit: int = Query(default=5, ge=1, le=100),
+    regions: Optional[str] = Query(default=None),
+):
     match_stage = {}
     if regions:
         region_list = regions.split(",")
-        match_stage = {"user.region": {"$in": region_list}}
+        match_stage = {"region": {"$in": region_list}}
 
+    # Per-user sector totals are maintained on submit; the region filter runs
+    # before grouping and each sector keeps its top `limit` users in the
+    # database, with their profiles joined in the same pipeline
     pipeline = [
+        *([{"$match": match_stage}] if match_stage else []),
         {
             "$group": {
-                "_id": {"user_id": "$user_id", "sector": "$sector"},
-                "total_emissions": {"$sum": "$estimated_co2e_kg"},
+                "_id": "$sector",
+                "top": {
+                    "$topN": {
+                        "n": limit,
+                        "sortBy": {"total": -1, "user_id": 1},
+                        "output": {"user_id": "$user_id", "total": "$total"},
+                    }
+                },
+            }
+        },
+        {"$sort": {"_id": 1}},
+        {
+            "$lookup": {
+                "from": "users",
+                "localField": "top.user_id",
+                "foreignField": "_id",
+                "pipeline": [{"$project": {"community_name": 1, "region": 1, "city": 1}}],
+                "as": "users",
             }
         },
-        {"$sort": {"_id.sector": 1, "total_emissions": -1}},
-    ]
-    sector_user_emissions = await db.ghg_submissions.aggregate(pipeline).to_list(None)
-
-    from collections import defaultdict
-
-    grouped = defaultdict(list)
-    for record in sector_user_emissions:
-        sector = record["_id"]["sector"]
-        grouped[sector].append(record)
-
-    top_by_sector = {sector: records[:limit] for sector, records in grouped.items()}
-    user_ids = [
-        r["_id"]["user_id"] for records in top_by_sector.values() for r in records
     ]
-    users = await db.users.find({"_id": {"$in": user_ids}}).to_list(None)
-    user_map = {u["_id"]: u for u in users}
+    result = await db.ghg_user_totals.aggregate(pipeline).to_list(None)
 
     response = {}
-    for sector, records in top_by_sector.items():
-        filtered = []
-        for rec in records:
-            uid = rec["_id"]["user_id"]
-            user = user_map.get(uid)
-            if user and (not regions or user.get("region") in region_list):
-                filtered.append(
-                    {
-                        "user_id": str(uid),
-                        "community_name": user.get("community_name"),
-                        "region": user.get("region"),
-                        "city": user.get("city"),
-                        "total_emissions": round(rec["total_emissions"], 2),
-                    }
-                )
-        response[sector] = filtered
+    for r in result:
+        user_map = {u["_id"]: u for u in r["users"]}
+        response[r["_id"]] = [
+            {
+                "user_id": str(rec["user_id"]),
+                "community_name": user.get("community_name"),
+                "region": user.get("region"),
+                "city": user.get("city"),
+                "total_emissions": round(rec["total"], 2),
+            }
+            for rec in r["top"]
+            if (user := user_map.get(rec["user_id"]))
+        ]
     return response
 
 
-@router.get("/top-emitters")
-@cache(expire=1800)
-async def get_top_emitters(limit: int = 5):
-    pipeline = [
-        {
-            "$group": {
-                "_id": "$user_id",
-                "total_emissions": {"$sum": "$estimated_co2e_kg"},
-            }
-        }
-    ]
-    all_users = await db.ghg_submissions.aggregate(pipeline).to_list(None)
-    all_users_sorted = sorted(
-        all_users, key=lambda x: x["total_emissions"], reverse=True
-    )
-
-    total_count = len(all_users_sorted)
-    user_ranks = {
-        str(doc["_id"]): round((i + 1) / total_count * 100, 2)
-        for i, doc in enumerate(all_users_sorted)
+def leaderboard_row(entry: dict, position: int, count: int) -> dict:
+    return {
+        "user_id": str(entry["_id"]),
+        "username": entry.get("username"),
+        "community_name": entry.get("community_name"),
+        "region": entry.get("region"),
+        "city": entry.get("city"),
+        "total_emissions": round(entry["total"], 2),
+        "global_percentile_rank": leaderboard.percentile(position, count),
     }
 
-    top = all_users_sorted[:limit]
-    user_ids = [doc["_id"] for doc in top]
-    users = await db.users.find({"_id": {"$in": user_ids}}).to_list(None)
-    user_map = {user["_id"]: user for user in users}
 
-    return [
-        {
-            "user_id": str(uid),
-            "username": user_map[uid]["username"],
-            "community_name": user_map[uid].get("community_name"),
-            "region": user_map[uid].get("region"),
-            "city": user_map[uid].get("city"),
-            "total_emissions": round(doc["total_emissions"], 2),
-            "global_percentile_rank": user_ranks[str(uid)],
-        }
-        for doc in top
-        if (uid := doc["_id"]) in user_map
-    ]
+@router.get("/top-emitters")
+@cached(expire=1800)
+async def get_top_emitters(limit: int = 5):
+    count = await leaderboard.count()
+    top = await leaderboard.top(limit)
+    return [leaderboard_row(entry, i + 1, count) for i, entry in enumerate(top)]
 
 
 @router.get("/lowest-emitters")
-@cache(expire=1800)
+@cached(expire=1800)
 async def get_lowest_emitters(limit: int = 5):
-    pipeline = [
-        {
-            "$group": {
-                "_id": "$user_id",
-                "total_emissions": {"$sum": "$estimated_co2e_kg"},
-            }
-        }
-    ]
-    all_users = await db.ghg_submissions.aggregate(pipeline).to_list(None)
-    all_users_sorted = sorted(all_users, key=lambda x: x["total_emissions"])
+    count = await leaderboard.count()
+    bottom = await leaderboard.bottom(limit)
+    return [leaderboard_row(entry, i + 1, count) for i, entry in enumerate(bottom)]
 
-    total_count = len(all_users_sorted)
-    user_ranks = {
-        str(doc["_id"]): round((i + 1) / total_count * 100, 2)
-        for i, doc in enumerate(all_users_sorted)
-    }
 
-    bottom = all_users_sorted[:limit]
-    user_ids = [doc["_id"] for doc in bottom]
-    users = await db.users.find({"_id": {"$in": user_ids}}).to_list(None)
-    user_map = {user["_id"]: user for user in users}
+# GET /api/ghg/user-rank/{user_id}
+# Purpose: Where one user stands among all emitters (rank 1 = highest total)
+@router.get("/user-rank/{user_id}")
+@cached(expire=1800)
+async def get_user_rank(user_id: str):
+    try:
+        object_id = ObjectId(user_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid user ID format")
 
-    return [
-        {
-            "user_id": str(uid),
-            "username": user_map[uid]["username"],
-            "community_name": user_map[uid].get("community_name"),
-            "region": user_map[uid].get("region"),
-            "city": user_map[uid].get("city"),
-            "total_emissions": round(doc["total_emissions"], 2),
-            "global_percentile_rank": user_ranks[str(uid)],
-        }
-        for doc in bottom
-        if (uid := doc["_id"]) in user_map
-    ]
+    ranked = await leaderboard.rank(object_id)
+    if ranked is None:
+        raise HTTPException(status_code=404, detail="No submissions found for this user")
+    entry, rank = ranked
+    count = await leaderboard.count()
+    return {**leaderboard_row(entry, rank, count), "rank": rank, "users": count}
 
 
 # -------------------------------- USER SPECIFIC ------------------------------ #
 
 
 @router.get("/user-summary/{user_id}")
+@cached(expire=600, tags=user_tags)
 async def get_user_summary(user_id: str):
     try:
         object_id = ObjectId(user_id)
@@ -662,52 +607,30 @@ async def compare_user_to_average(user_id: str):
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid user ID format")
 
-    # Get all sector-level totals for user
-    user_data = await db.ghg_submissions.aggregate(
-        [
-            {"$match": {"user_id": object_id}},
-            {
-                "$group": {
-                    "_id": "$sector",
-                    "user_total": {"$sum": "$estimated_co2e_kg"},
-                }
-            },
-        ]
-    ).to_list(None)
-
-    # Get national stats and percentile distribution
-    national_data = await db.ghg_submissions.aggregate(
-        [
-            {
-                "$group": {
-                    "_id": {"sector": "$sector", "user_id": "$user_id"},
-                    "user_sector_total": {"$sum": "$estimated_co2e_kg"},
-                }
-            },
-            {
-                "$group": {
-                    "_id": "$_id.sector",
-                    "user_totals": {"$push": "$user_sector_total"},
-                    "avg_total": {"$avg": "$user_sector_total"},
-                    "count": {"$sum": 1},
-                }
-            },
-        ]
-    ).to_list(None)
+    # The user's sector totals and, per sector, the national count, sum and
+    # quantile sketch of user totals, all maintained on submit
+    user_totals = {
+        row["sector"]: row["total"]
+        async for row in db.ghg_user_totals.find(
+            {"user_id": object_id}, {"sector": 1, "total": 1}
+        )
+    }
 
     # Combine sector-level comparison
     comparison = []
-    for sector_stat in national_data:
-        sector = sector_stat["_id"]
-        user_total = next(
-            (u["user_total"] for u in user_data if u["_id"] == sector), 0.0
-        )
-        user_totals = sector_stat["user_totals"]
-        avg_total = sector_stat["avg_total"]
-
-        # Percentile rank computation
-        below = len([v for v in user_totals if v < user_total])
-        percentile = round((below / len(user_totals)) * 100, 2)
+    # At most one sketch per sector: read them all rather than filter (and
+    # scan) on count
+    async for sketch in db.ghg_sketches.find():
+        if sketch["count"] <= 0:
+            continue
+        sector = sketch["_id"]
+        user_total = user_totals.get(sector, 0.0)
+        avg_total = sketch["sum"] / sketch["count"]
+
+        # Percentile rank from the sketch; may understate by the share of
+        # users within ~2% below this total (see core/sketch.py)
+        below = rank_below(sketch["buckets"], user_total)
+        percentile = round((below / sketch["count"]) * 100, 2)
 
         comparison.append(
             {
@@ -716,13 +639,58 @@ async def compare_user_to_average(user_id: str):
                 "national_avg": round(avg_total, 2),
                 "difference": round(user_total - avg_total, 2),
                 "percentile_rank": percentile,
-                "entries": sector_stat["count"],
+                "entries": sketch["count"],
             }
         )
 
     return comparison
 
 
+# Submission history of the logged-in community, newest first
+# Keyset-paginated (see core/pagination.py): pass next_cursor back as
+# `cursor` for the following page; `fields` limits the returned fields
+@router.get("/my-submissions")
+async def my_submissions(
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None),
+    sector: Optional[Literal["energy", "transport", "waste", "agriculture", "ippu"]] = Query(
+        default=None
+    ),
+    fields: Optional[str] = Query(default=None, description="Comma-separated field names"),
+    current_user=Depends(get_current_user),
+):
+    query = {"user_id": current_user["_id"]}
+    if sector:
+        query["sector"] = sector
+    if cursor:
+        query.update(pagination.after(cursor))
+
+    projection = {"user_id": 0}
+    if fields:
+        requested = {name.strip() for name in fields.split(",")} - {""}
+        unknown = requested - SUBMISSION_FIELDS
+        if unknown:
+            raise HTTPException(
+                status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+            )
+        projection = {name: 1 for name in requested | {"sector", "created_at"}}
+
+    # One extra row tells whether there is a next page. The hint keeps the
+    # plan on the (user_id, created_at, _id) range scan, which needs no sort
+    docs = await (
+        db.ghg_submissions.find(query, projection)
+        .sort(pagination.SORT)
+        .hint("user_created_id")
+        .limit(limit + 1)
+        .to_list(length=None)
+    )
+    page = docs[:limit]
+    return {
+        "items": [{**doc, "_id": str(doc["_id"])} for doc in page],
+        "next_cursor": pagination.encode_cursor(page[-1]) if len(docs) > limit else None,
+    }
+
+
 # Helper function to generate a natural description
 def generate_description(community_type, community_name, city, region, labels, data):
     total_emissions = sum(data)
@@ -738,22 +706,38 @@ def generate_description(community_type, community_name, city, region, labels, d
     return description
 
 
-@router.get("/my-summary-interpret")
+def job_status(job: dict) -> dict:
+    body = {
+        "job_id": str(job["_id"]),
+        "status": job["status"],
+        "created_at": job["created_at"],
+        "finished_at": job.get("finished_at"),
+    }
+    if job["status"] == llm_jobs.DONE:
+        body.update(job["payload"], ai_interpretation=job["result"], cached=job["cached"])
+    elif job["status"] == llm_jobs.FAILED:
+        body["detail"] = job["error"]
+    return body
+
+
+@router.get("/my-summary-interpret", status_code=status.HTTP_202_ACCEPTED)
 async def my_summary_interpret(
-    request: Request, current_user=Depends(get_current_user)
+    request: Request, response: Response, current_user=Depends(get_current_user)
 ):
+    """Queue an interpretation of the user's totals and return its job (202),
+    or the finished job (200) when the same inputs were interpreted before.
+    Poll /my-summary-interpret/{job_id} for the result."""
     user_id = current_user["_id"]
 
-    # Rate limiting: check if user requested within the last 7 days
-    one_week_ago = datetime.now(timezone.utc) - timedelta(days=7)
-    recent_request = await db.llm_requests.find_one(
-        {
-            "user_id": user_id,
-            "endpoint": "my-summary-interpret",
-            "requested_at": {"$gte": one_week_ago},
-        }
-    )
-    if recent_request:
+    # A request already in progress is returned instead of queueing another
+    pending = await llm_jobs.active_job(user_id)
+    if pending:
+        return job_status(pending)
+
+    # Rate limiting: take the user's weekly interpretation window
+    now = datetime.now(timezone.utc)
+    window = (user_id, windows.LLM_SCOPE)
+    if await windows.claim([window], now):
         # Return 429 Too Many Requests with a message
         return JSONResponse(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
@@ -768,26 +752,20 @@ async def my_summary_interpret(
     region = current_user.get("region", "the Philippines")
     city = current_user.get("city", "")
 
-    # Aggregate user GHG data by sector
-    pipeline = [
-        {"$match": {"user_id": user_id}},
-        {
-            "$group": {
-                "_id": "$sector",
-                "total_emissions": {"$sum": "$estimated_co2e_kg"},
-                "count": {"$sum": 1},
-            }
-        },
-        {"$sort": {"_id": 1}},
-    ]
-    result = await db.ghg_submissions.aggregate(pipeline).to_list(length=None)
+    # Per-sector totals, maintained on every submission (core/user_totals.py)
+    result = await (
+        db.ghg_user_totals.find({"user_id": user_id}, {"sector": 1, "total": 1})
+        .sort("sector", 1)
+        .to_list(None)
+    )
     if not result:
+        await windows.release([window], now)
         raise HTTPException(
             status_code=404, detail="No GHG data found for your account."
         )
 
-    labels = [r["_id"] for r in result]
-    data = [round(r["total_emissions"], 2) for r in result]
+    labels = [r["sector"] for r in result]
+    data = [round(r["total"], 2) for r in result]
 
     # Construct the prompt with the carbon offset bullet request
     prompt = (
@@ -805,44 +783,35 @@ async def my_summary_interpret(
         community_type, community_name, city, region, labels, data
     )
 
-    # Call the Hugging Face chat completion in a threadpool (async-safe)
-    def call_llm():
-        return (
-            hf_client.chat_completion(
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a helpful sustainability expert.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-                temperature=0.7,
-                max_tokens=400,
-            )
-            .choices[0]
-            .message["content"]
-            .strip()
-        )
-
+    context = {
+        "community_type": community_type,
+        "community_name": community_name,
+        "city": city,
+        "region": region,
+    }
     try:
-        ai_output = await run_in_threadpool(call_llm)
-    except Exception as e:
-        raise HTTPException(
-            status_code=500, detail=f"LLM failed to generate interpretation: {str(e)}"
+        job = await llm_jobs.enqueue(
+            user_id,
+            now,
+            llm_jobs.input_key(context, labels, data),
+            prompt,
+            {
+                "summary_text": prompt,
+                "description": description,
+                "raw_data": {"labels": labels, "data": data},
+            },
         )
-
-    # Log the request for rate limiting
-    await db.llm_requests.insert_one(
-        {
-            "user_id": user_id,
-            "endpoint": "my-summary-interpret",
-            "requested_at": datetime.now(timezone.utc),
-        }
-    )
-
-    return {
-        "summary_text": prompt,
-        "description": description,
-        "ai_interpretation": ai_output,
-        "raw_data": {"labels": labels, "data": data},
-    }
+    except HTTPException:
+        await windows.release([window], now)
+        raise
+    if job["status"] == llm_jobs.DONE:
+        response.status_code = status.HTTP_200_OK
+    return job_status(job)
+
+
+@router.get("/my-summary-interpret/{job_id}")
+async def my_summary_interpret_job(job_id: str, current_user=Depends(get_current_user)):
+    job = await llm_jobs.get_job(job_id, current_user["_id"])
+    if job is None:
+        raise HTTPException(status_code=404, detail="Interpretation job not found")
+    return job_status(job)
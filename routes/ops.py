@@ -0,0 +1,65 @@
+import os
+import secrets
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+
+from core import llm_jobs, slow_queries
+from core.db import client
+from core.token_cache import token_cache
+from utils import security
+
+OPS_TOKEN = os.getenv("OPS_TOKEN")
+
+
+# Operational endpoints (including /metrics) require a matching X-Ops-Token
+# header, and do not exist at all while OPS_TOKEN is unset: they expose
+# internals and can re-run recorded queries.
+async def require_ops_token(request: Request):
+    if not OPS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not secrets.compare_digest(request.headers.get("X-Ops-Token", ""), OPS_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid ops token")
+
+
+router = APIRouter(dependencies=[Depends(require_ops_token)])
+
+
+@router.get("/token-cache")
+async def token_cache_stats():
+    return token_cache.stats()
+
+
+@router.get("/passwords")
+async def password_stats():
+    return security.stats()
+
+
+@router.get("/llm")
+async def llm_stats():
+    # Job queue depth and backend throughput (tokens/sec for LLM_BACKEND=local)
+    return llm_jobs.stats()
+
+
+@router.get("/slow-queries")
+async def slow_query_log(limit: int = Query(50, ge=1, le=1000)):
+    # Newest first; SLOW_QUERY_MS sets the threshold
+    records = list(slow_queries.listener.records)[::-1][:limit]
+    return {
+        "threshold_ms": slow_queries.listener.threshold_ms,
+        "records": [slow_queries.public(r) for r in records],
+    }
+
+
+@router.delete("/slow-queries")
+async def clear_slow_query_log():
+    slow_queries.listener.records.clear()
+    return {"message": "Slow-query log cleared"}
+
+
+@router.get("/slow-queries/{record_id}/explain")
+async def explain_slow_query(record_id: int):
+    record = slow_queries.listener.find(record_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Slow query not found (evicted from the log?)")
+    if slow_queries.writes(record):
+        raise HTTPException(status_code=400, detail="Pipelines ending in $out or $merge are not explained")
+    return await slow_queries.explain(client[record["database"]], record)
@@ -0,0 +1,115 @@
+"""Stamp region, city and community_type from users onto ghg_submissions.
+
+Progress is checkpointed in the `migrations` collection after every batch of
+users, so an interrupted run resumes after the last fully processed user.
+Submissions of users that no longer exist (deleted before delete_user
+removed them) get no geography. They are counted and reported once every
+user has been processed, and deleted only with --drop-orphans. Kept, they
+still count in national totals, as they did before this migration, under
+no region.
+
+Usage (from the project root):
+    python -m scripts.backfill_submission_geo [--batch-size 500] [--restart] [--drop-orphans]
+"""
+
+import argparse
+import asyncio
+from datetime import datetime, timezone
+
+from pymongo import UpdateMany
+
+from core.db import db
+from core.submissions import GEO_FIELDS, user_geo
+
+MIGRATION_ID = "backfill_submission_geo"
+
+
+async def backfill(batch_size: int, restart: bool):
+    if restart:
+        await db.migrations.delete_one({"_id": MIGRATION_ID})
+
+    state = await db.migrations.find_one({"_id": MIGRATION_ID}) or {}
+    last_user_id = state.get("last_user_id")
+    processed = state.get("users_processed", 0)
+    if last_user_id:
+        print(f"Resuming after user {last_user_id} ({processed} users done).")
+
+    projection = {field: 1 for field in GEO_FIELDS}
+    while True:
+        query = {"_id": {"$gt": last_user_id}} if last_user_id else {}
+        users = (
+            await db.users.find(query, projection)
+            .sort("_id", 1)
+            .limit(batch_size)
+            .to_list(None)
+        )
+        if not users:
+            break
+
+        result = await db.ghg_submissions.bulk_write(
+            [
+                UpdateMany({"user_id": user["_id"]}, {"$set": user_geo(user)})
+                for user in users
+            ],
+            ordered=False,
+        )
+
+        last_user_id = users[-1]["_id"]
+        processed += len(users)
+        await db.migrations.update_one(
+            {"_id": MIGRATION_ID},
+            {
+                "$set": {
+                    "last_user_id": last_user_id,
+                    "users_processed": processed,
+                    "updated_at": datetime.now(timezone.utc),
+                }
+            },
+            upsert=True,
+        )
+        print(f"{processed} users processed, {result.modified_count} submissions updated.")
+
+    await db.migrations.update_one(
+        {"_id": MIGRATION_ID},
+        {"$set": {"completed_at": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+
+
+async def report_orphans(drop: bool):
+    # Every live user has been processed at this point, so anything still
+    # missing a region belongs to a deleted account.
+    orphan_query = {"region": {"$exists": False}}
+    orphans = await db.ghg_submissions.count_documents(orphan_query)
+    if not orphans:
+        return
+    if drop:
+        await db.ghg_submissions.delete_many(orphan_query)
+        print(f"Deleted {orphans} submissions belonging to deleted users.")
+    else:
+        print(
+            f"{orphans} submissions belong to deleted users; "
+            "re-run with --drop-orphans to remove them."
+        )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument(
+        "--restart", action="store_true", help="ignore the saved checkpoint"
+    )
+    parser.add_argument(
+        "--drop-orphans",
+        action="store_true",
+        help="delete submissions whose user no longer exists",
+    )
+    args = parser.parse_args()
+
+    await backfill(args.batch_size, args.restart)
+    await report_orphans(args.drop_orphans)
+    print("Backfill complete.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
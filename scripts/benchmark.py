@@ -0,0 +1,363 @@
+"""Per-route latency benchmark of the GHG API against a seeded local MongoDB.
+
+For each scale point (users x weeks) the benchmark database is reseeded
+with scripts/seed.py, then every GET route of routes/ghg.py (with and
+without a `regions` filter where supported) is driven through the app
+in-process with an async HTTP client at a fixed concurrency: first with the
+response cache bypassed (cold), then after one priming request (warm). Warm
+rows also report the response size and the time to encode its data with the
+response cache's orjson coder and with FastAPI's default JSON path.
+POST /submit and /submit-batch run next, each request as a different
+seeded user so the 7-day rule does not reject them. Last, POST /login is
+measured alone, and GET /me both idle and while logins run, which shows
+how much password hashing holds up other requests (compare runs with
+PASSWORD_WORKERS=0, hashing on the event loop, against the default).
+
+Reports p50/p95/p99 latency and throughput per route and writes the results
+as JSON to bench_results/ (or --output) for comparison between commits.
+
+Usage (from the project root, with MONGO_URI pointing at a local mongod):
+    python -m scripts.benchmark [--scales 200x52,2000x156] [--requests 200] [--concurrency 16]
+    python -m scripts.benchmark --compare bench_results/<earlier run>.json
+
+The data goes to the MONGO_DB database (default ghg_scout_bench), which
+is dropped and reseeded at every scale point.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+import numpy as np
+
+SECTORS = ["energy", "transport", "waste", "agriculture", "ippu"]
+# Routes that call the hosted LLM, and the bulk export, are left out unless
+# named in --include
+SKIP_BY_DEFAULT = {"/my-summary-interpret", "/export"}
+NO_CACHE = {"Cache-Control": "no-store"}
+
+
+def parse_scales(value: str) -> list:
+    scales = []
+    for scale in value.split(","):
+        users, weeks = scale.lower().split("x")
+        scales.append((int(users), int(weeks)))
+    return scales
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def summarize(latencies: list, errors: int, wall: float) -> dict:
+    ms = np.array(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+        "mean_ms": round(float(ms.mean()), 2),
+        "throughput_rps": round(len(latencies) / wall, 1),
+    }
+
+
+async def measure(client, requests: list, concurrency: int) -> dict:
+    """Send (method, url, kwargs) requests with `concurrency` in flight."""
+    pending = iter(requests)
+    latencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        for method, url, kwargs in pending:
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - started)
+            errors += response.status_code >= 400
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def encoding_costs(body: bytes, repeat: int = 20) -> dict:
+    """Size of a response body and the time to encode its data once with
+    the response cache's orjson coder and with FastAPI's default path
+    (jsonable_encoder, then json.dumps)."""
+    from fastapi.encoders import jsonable_encoder
+
+    from core.cache import ResponseBytesCoder
+
+    data = json.loads(body)
+
+    def best_ms(encode) -> float:
+        times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            encode(data)
+            times.append(time.perf_counter() - started)
+        return round(min(times) * 1000, 3)
+
+    return {
+        "bytes": len(body),
+        "encode_ms": best_ms(ResponseBytesCoder.encode),
+        "stdlib_encode_ms": best_ms(lambda d: json.dumps(jsonable_encoder(d)).encode()),
+    }
+
+
+def get_variants(router, path_values: dict, region: str, include: set) -> list:
+    """(label, url, params) for every GET route of the router."""
+    from fastapi.routing import APIRoute
+
+    variants = []
+    for route in router.routes:
+        if not isinstance(route, APIRoute) or "GET" not in route.methods:
+            continue
+        if route.path in SKIP_BY_DEFAULT and route.path not in include:
+            continue
+        if any(p.name not in path_values for p in route.dependant.path_params):
+            continue
+        url = "/api/ghg" + route.path.format(**path_values)
+        variants.append((f"GET {route.path}", url, {}))
+        if "regions" in {p.alias for p in route.dependant.query_params}:
+            variants.append((f"GET {route.path}?regions", url, {"regions": region}))
+    return variants
+
+
+async def issue_tokens(db, users: list) -> list:
+    tokens = [str(uuid.uuid4()) for _ in users]
+    await db.tokens.insert_many(
+        [{"token": t, "username": u["username"]} for t, u in zip(tokens, users)]
+    )
+    return tokens
+
+
+async def bench_scale(args, users: int, weeks: int) -> dict:
+    import httpx
+
+    from core.db import db
+    from main import app
+    from routes import ghg
+    from scripts import seed
+
+    print(f"\n== {users} users x {weeks} weeks ==")
+    started = time.perf_counter()
+    await seed.seed(
+        argparse.Namespace(
+            users=users, weeks=weeks, seed=args.seed, start_date="2022-01-01",
+            batch_size=10000, concurrency=4, reset=True,
+        )
+    )
+    seed_seconds = time.perf_counter() - started
+    submissions = await db.ghg_submissions.estimated_document_count()
+
+    results = []
+
+    def record(label, cache, stats):
+        results.append({"route": label, "cache": cache, **stats})
+        print(
+            f"{label:<48} {cache:<5} p50={stats['p50_ms']:>8.2f}ms "
+            f"p95={stats['p95_ms']:>8.2f}ms p99={stats['p99_ms']:>8.2f}ms "
+            f"{stats['throughput_rps']:>8.1f} req/s errors={stats['errors']}"
+            + (
+                f" {stats['bytes']:>9,}B encode={stats['encode_ms']:.3f}ms"
+                f" (stdlib {stats['stdlib_encode_ms']:.3f}ms)"
+                if "bytes" in stats
+                else ""
+            )
+        )
+
+    seeded_users = await db.users.find({}, {"username": 1, "region": 1}).to_list(None)
+    # Readers use the first user. Writers are split in two disjoint halves so
+    # /submit-batch is not rejected for sectors /submit already used; /submit
+    # rotates over its users and then over sectors
+    tokens = await issue_tokens(db, seeded_users[: 2 * args.requests])
+    half = max(len(tokens) // 2, 1)
+    submit_tokens, batch_tokens = tokens[:half], tokens[half:]
+    reader = seeded_users[0]
+    auth = {"Authorization": f"Bearer {tokens[0]}"}
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench", timeout=None
+        ) as client:
+            variants = get_variants(
+                ghg.router,
+                {"user_id": str(reader["_id"])},
+                reader.get("region"),
+                set(args.include),
+            )
+            for label, url, params in variants:
+                if args.routes and not any(r in label for r in args.routes):
+                    continue
+                cold = [
+                    ("GET", url, {"params": params, "headers": {**auth, **NO_CACHE}})
+                ] * args.requests
+                record(label, "cold", await measure(client, cold, args.concurrency))
+
+                warm = [("GET", url, {"params": params, "headers": auth})] * args.requests
+                primed = await client.request(*warm[0][:2], **warm[0][2])
+                record(
+                    label, "warm",
+                    {
+                        **await measure(client, warm, args.concurrency),
+                        **encoding_costs(primed.content),
+                    },
+                )
+
+            if not args.routes or any("submit" in r for r in args.routes):
+                submit = [
+                    (
+                        "POST",
+                        "/api/ghg/submit",
+                        {
+                            "json": {"sector": SECTORS[(i // half) % len(SECTORS)]},
+                            "headers": {"Authorization": f"Bearer {submit_tokens[i % half]}"},
+                        },
+                    )
+                    for i in range(args.requests)
+                ]
+                record("POST /submit", "-", await measure(client, submit, args.concurrency))
+
+                # One item per sector for one user per request
+                batch = [
+                    (
+                        "POST",
+                        "/api/ghg/submit-batch",
+                        {
+                            "json": {
+                                "items": [
+                                    {"submission": {"sector": sector}} for sector in SECTORS
+                                ]
+                            },
+                            "headers": {"Authorization": f"Bearer {token}"},
+                        },
+                    )
+                    for token in batch_tokens
+                ]
+                if batch:
+                    record(
+                        "POST /submit-batch", "-",
+                        await measure(client, batch, args.concurrency),
+                    )
+
+            if not args.routes or any(r in "POST /login" or r in "GET /me" for r in args.routes):
+                logins = [
+                    (
+                        "POST",
+                        "/api/login",
+                        {
+                            "json": {
+                                "username": seeded_users[i % len(seeded_users)]["username"],
+                                "password": seed.COMMON_PASSWORD,
+                            }
+                        },
+                    )
+                    for i in range(args.requests)
+                ]
+                me = [("GET", "/api/me", {"headers": auth})] * args.requests
+                record("POST /login", "-", await measure(client, logins, args.concurrency))
+                record("GET /me (idle)", "-", await measure(client, me, args.concurrency))
+                during, _ = await asyncio.gather(
+                    measure(client, me, args.concurrency),
+                    measure(client, logins, args.concurrency),
+                )
+                record("GET /me (during logins)", "-", during)
+
+    return {
+        "users": users,
+        "weeks": weeks,
+        "submissions": submissions,
+        "seed_seconds": round(seed_seconds, 1),
+        "routes": results,
+    }
+
+
+def compare(current: dict, baseline_path: str, threshold: float):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {
+        (scale["users"], scale["weeks"], row["route"], row["cache"]): row
+        for scale in baseline["scales"]
+        for row in scale["routes"]
+    }
+    print(f"\nCompared with {baseline_path} ({baseline['meta']['commit']}):")
+    for scale in current["scales"]:
+        for row in scale["routes"]:
+            key = (scale["users"], scale["weeks"], row["route"], row["cache"])
+            if key not in previous or not previous[key]["p95_ms"]:
+                continue
+            ratio = row["p95_ms"] / previous[key]["p95_ms"]
+            flag = "  SLOWER" if ratio > 1 + threshold else ""
+            print(
+                f"{scale['users']}x{scale['weeks']} {row['route']:<48} {row['cache']:<5} "
+                f"p95 {previous[key]['p95_ms']:>8.2f} -> {row['p95_ms']:>8.2f}ms "
+                f"({ratio:.2f}x){flag}"
+            )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=parse_scales, default=parse_scales("200x52,2000x156"),
+                        help="comma-separated users x weeks scale points")
+    parser.add_argument("--requests", type=int, default=200, help="requests per route and cache mode")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--routes", nargs="*", default=[], help="only routes containing these strings")
+    parser.add_argument("--include", nargs="*", default=[], help="routes skipped by default to run anyway")
+    parser.add_argument("--db", default=os.getenv("MONGO_DB", "ghg_scout_bench"))
+    parser.add_argument("--output", help="results file (default bench_results/<time>-<commit>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare p95 latencies with")
+    parser.add_argument("--regression-threshold", type=float, default=0.2,
+                        help="flag routes whose p95 grew by more than this fraction")
+    args = parser.parse_args()
+
+    if args.db == "ghg_scout":
+        sys.exit("Refusing to reseed the application database; pick another --db.")
+    # core.db reads MONGO_DB at import time, so set it before importing the app
+    os.environ["MONGO_DB"] = args.db
+
+    commit = git_commit()
+    results = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+        },
+        "scales": [],
+    }
+    for users, weeks in args.scales:
+        results["scales"].append(await bench_scale(args, users, weeks))
+
+    output = args.output or os.path.join(
+        "bench_results",
+        f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{commit}.json",
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        compare(results, args.compare, args.regression_threshold)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
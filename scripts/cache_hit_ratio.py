@@ -0,0 +1,135 @@
+"""Measure response-cache hit ratio under a mixed read/write workload.
+
+Replays one random workload twice against the cache layer alone (no
+MongoDB, no HTTP): once clearing the whole cache on every submission and
+login as the API used to, once with the tag-based invalidation from
+core/cache.py. Reads are spread over national dashboards, region-filtered
+dashboards and per-user summaries.
+
+Exits with status 1 when the tag-based hit ratio falls below --min-hit-ratio
+(0.6 suits the default workload, which measures about 0.66) or does not beat
+the clear-everything baseline; lower the threshold with heavier write ratios.
+
+Usage (from the project root):
+    python -m scripts.cache_hit_ratio [--ops 50000] [--write-ratio 0.05] [--login-ratio 0.05] [--min-hit-ratio 0.6]
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+
+from fastapi_cache import FastAPICache
+
+from core.cache import (
+    GLOBAL,
+    invalidate,
+    region_tag,
+    regions_tags,
+    tagged_key_builder,
+    user_tag,
+    user_tags,
+)
+from core.cache_backends import MemoryBackend
+
+REGIONS = [f"region-{i:02d}" for i in range(17)]
+SECTORS = ["energy", "transport", "waste", "agriculture", "ippu"]
+NATIONAL = ["community-summary", "regional-trend-summary", "sectoral-trend", "top-emitters"]
+REGIONAL = ["timeseries", "aggregated-by-type", "sectoral-by-region", "top-by-sector"]
+
+
+def build_workload(args) -> list:
+    rng = random.Random(args.seed)
+    users = [(f"user{i:04d}", rng.choice(REGIONS)) for i in range(args.users)]
+    workload = []
+    for _ in range(args.ops):
+        roll = rng.random()
+        if roll < args.write_ratio:
+            workload.append(("submit", rng.choice(users), rng.choice(SECTORS)))
+        elif roll < args.write_ratio + args.login_ratio:
+            workload.append(("login",))
+        else:
+            kind = rng.random()
+            if kind < 0.4:
+                workload.append(("read", rng.choice(NATIONAL), {}))
+            elif kind < 0.8:
+                workload.append(("read", rng.choice(REGIONAL), {"regions": rng.choice(REGIONS)}))
+            else:
+                workload.append(("read", "user-summary", {"user_id": rng.choice(users)[0]}))
+    return workload
+
+
+def endpoint(name):
+    async def func(**kwargs):
+        return None
+
+    func.__name__ = name.replace("-", "_")
+    return func
+
+
+async def replay(workload, tagged: bool) -> tuple:
+    FastAPICache.reset()
+    FastAPICache.init(MemoryBackend(max_entries=100000), prefix="sim")
+    backend = FastAPICache.get_backend()
+    key_builders = {
+        **{name: tagged_key_builder([GLOBAL]) for name in NATIONAL},
+        **{name: tagged_key_builder(regions_tags) for name in REGIONAL},
+        "user-summary": tagged_key_builder(user_tags),
+    }
+    funcs = {name: endpoint(name) for name in key_builders}
+
+    hits = misses = 0
+    for op in workload:
+        if op[0] == "read":
+            _, name, kwargs = op
+            key = await key_builders[name](funcs[name], "sim:", kwargs=kwargs)
+            if await backend.get(key) is None:
+                misses += 1
+                await backend.set(key, b"{}", 600)
+            else:
+                hits += 1
+        elif not tagged:
+            await FastAPICache.clear()
+        elif op[0] == "submit":
+            _, (user_id, region), _ = op
+            await invalidate(GLOBAL, region_tag(region), user_tag(user_id))
+        # tagged logins change no analytic data and invalidate nothing
+    return hits, misses
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ops", type=int, default=50000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--write-ratio", type=float, default=0.05)
+    parser.add_argument("--login-ratio", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--min-hit-ratio",
+        type=float,
+        default=0.6,
+        help="fail when tag-based invalidation hits less often than this",
+    )
+    args = parser.parse_args()
+
+    workload = build_workload(args)
+    ratios = {}
+    for label, tagged in (("global clear", False), ("tagged", True)):
+        hits, misses = await replay(workload, tagged)
+        ratios[tagged] = hits / max(hits + misses, 1)
+        print(
+            f"{label:<13} hits={hits:<7} misses={misses:<7} "
+            f"hit ratio={ratios[tagged]:.3f}"
+        )
+
+    if ratios[True] < args.min_hit_ratio:
+        print(f"FAIL: tagged hit ratio {ratios[True]:.3f} is below {args.min_hit_ratio}")
+        sys.exit(1)
+    if ratios[True] <= ratios[False]:
+        print("FAIL: tagged invalidation does not beat clearing the whole cache")
+        sys.exit(1)
+    print("Hit ratio OK.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
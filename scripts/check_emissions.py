@@ -0,0 +1,173 @@
+"""Check that the batch emission calculation matches the scalar one exactly.
+
+Compares core.emissions.estimate_co2e against hand-worked figures of the
+original per-record formulas, then runs random submissions of every sector
+(with integer inputs, missing fields and nulls mixed in) through both
+estimate_co2e and estimate_co2e_batch. Needs no database.
+
+Usage (from the project root):
+    python -m scripts.check_emissions [--submissions 100000] [--seed 42]
+
+Exits with status 1 on any difference.
+"""
+
+import argparse
+import random
+import sys
+import time
+
+from core.emissions import (
+    CATEGORICAL_FIELDS,
+    FUEL_EF,
+    NUMERIC_FIELDS,
+    RICE_EF,
+    WASTE_EF,
+    estimate_co2e,
+    estimate_co2e_batch,
+)
+
+# Figures produced by the formulas previously inlined in routes/ghg.py and
+# scripts/seed.py
+KNOWN_CASES = [
+    (
+        {
+            "sector": "energy",
+            "electricity_consumed_kwh": 250.5,
+            "lpg_used_kg": 11,
+            "kerosene_used_liters": 0,
+            "firewood_used_kg": 40.2,
+            "diesel_used_liters": 0,
+            "gasoline_used_liters": 12.75,
+            "coal_used_kg": 0,
+        },
+        240.6,
+    ),
+    (
+        {
+            "sector": "transport",
+            "number_of_vehicles": 2,
+            "distance_travelled_daily_km": 18.5,
+            "travel_frequency_per_week": 5,
+            "trips_per_day": 2,
+            "fuel_type": "Gasoline",
+        },
+        858.4,
+    ),
+    (
+        {
+            "sector": "waste",
+            "waste_generated_kg_per_month": 120.0,
+            "organic_fraction_percent": 55.5,
+            "waste_disposal_method": "landfill",
+            "methane_capture": True,
+        },
+        59.94,
+    ),
+    (
+        {
+            "sector": "waste",
+            "waste_generated_kg_per_month": 80,
+            "organic_fraction_percent": 40,
+            "waste_disposal_method": "composting",
+            "methane_capture": True,
+        },
+        6.4,
+    ),
+    (
+        {
+            "sector": "agriculture",
+            "number_of_cattle": 3,
+            "number_of_carabao": 1,
+            "number_of_goats": 0,
+            "number_of_pigs": 4,
+            "number_of_chickens": 25,
+            "fertilizer_applied_kg": 60.5,
+            "rice_paddy_area_hectares": 1.25,
+            "rice_water_management": "intermittent_flooding",
+        },
+        6588.75,
+    ),
+    (
+        {
+            "sector": "ippu",
+            "cement_produced_tonnes": 1.5,
+            "lime_produced_tonnes": 0,
+            "steel_produced_tonnes": 0.75,
+            "refrigerant_consumed_kg": 2.2,
+            "solvent_used_liters": 14,
+            "other_process_emissions_CO2e_tonnes": 0.3,
+        },
+        6024.0,
+    ),
+]
+
+CATEGORICAL_CHOICES = {
+    "fuel_type": [*FUEL_EF, "Diesel", "biodiesel", None],
+    "waste_disposal_method": [*WASTE_EF, "burial"],
+    "methane_capture": [True, False, None],
+    "rice_water_management": [*RICE_EF, "upland"],
+}
+
+
+def random_submission(rng: random.Random) -> dict:
+    sector = rng.choice(list(NUMERIC_FIELDS))
+    doc = {"sector": sector}
+    for field in NUMERIC_FIELDS[sector]:
+        roll = rng.random()
+        if roll < 0.05:
+            continue  # missing
+        if roll < 0.1:
+            doc[field] = None
+        elif roll < 0.3:
+            doc[field] = 0
+        elif roll < 0.5:
+            doc[field] = rng.randint(1, 500)
+        else:
+            doc[field] = round(rng.uniform(0, 1000), rng.choice([1, 2, 3]))
+    for field in CATEGORICAL_FIELDS[sector]:
+        if rng.random() < 0.9:
+            doc[field] = rng.choice(CATEGORICAL_CHOICES[field])
+    return doc
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--submissions", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    failures = 0
+    for doc, expected in KNOWN_CASES:
+        for actual in (estimate_co2e(doc), estimate_co2e_batch([doc])[0]):
+            if actual != expected:
+                failures += 1
+                print(f"  {doc['sector']}: expected {expected}, got {actual}")
+
+    rng = random.Random(args.seed)
+    docs = [random_submission(rng) for _ in range(args.submissions)]
+
+    started = time.perf_counter()
+    scalar = [estimate_co2e(doc) for doc in docs]
+    scalar_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batch = estimate_co2e_batch(docs)
+    batch_time = time.perf_counter() - started
+
+    for doc, expected, actual in zip(docs, scalar, batch):
+        if actual != expected:
+            failures += 1
+            if failures <= 20:
+                print(f"  mismatch {doc}: scalar {expected}, batch {actual}")
+
+    print(
+        f"{len(docs)} submissions: scalar {scalar_time:.3f}s, batch {batch_time:.3f}s"
+    )
+    if failures:
+        print(f"{failures} differences between scalar and batch results.")
+        sys.exit(1)
+    print("Scalar and batch results match.")
+
+
+if __name__ == "__main__":
+    main()
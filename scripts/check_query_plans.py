@@ -0,0 +1,120 @@
+"""Fail when a filtered query issued by routes/ghg.py falls back to COLLSCAN.
+
+Runs against an already seeded database (see scripts/seed.py): turns on the
+MongoDB profiler, calls every GET route of the GHG router without side
+effects through the app in-process (with and without a `regions` filter where
+supported), then reads the plan summaries back from system.profile. Unfiltered whole-collection
+aggregations are reported but not treated as failures.
+
+Usage (from the project root):
+    python -m scripts.check_query_plans [--username user001 --password seed-password]
+"""
+
+import argparse
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+
+import httpx
+from bson import ObjectId
+from fastapi.routing import APIRoute
+
+from core.db import db
+from core.windows import last_times
+from main import app
+from routes import ghg
+
+NO_CACHE = {"Cache-Control": "no-store"}
+# Routes with side effects: the interpretation claims the user's weekly
+# window and queues an LLM job
+SKIP = {"/my-summary-interpret"}
+
+
+def _has_filter(command: dict) -> bool:
+    if "filter" in command:
+        return bool(command["filter"])
+    pipeline = command.get("pipeline") or []
+    return bool(pipeline) and bool(pipeline[0].get("$match"))
+
+
+async def _drive_routes(client: httpx.AsyncClient, username: str, password: str):
+    login = await client.post(
+        "/api/login", json={"username": username, "password": password}
+    )
+    login.raise_for_status()
+    token = login.json()["token"]
+    me = login.json()["user"]
+    auth = {"Authorization": f"Bearer {token}", **NO_CACHE}
+    path_values = {"user_id": me["id"]}
+
+    for route in ghg.router.routes:
+        if not isinstance(route, APIRoute) or "GET" not in route.methods:
+            continue
+        if route.path in SKIP:
+            print(f"skipping {route.path}: has side effects")
+            continue
+        path_params = [p.name for p in route.dependant.path_params]
+        if any(name not in path_values for name in path_params):
+            print(f"skipping {route.path}: no sample value for its path parameters")
+            continue
+        url = "/api/ghg" + route.path.format(**path_values)
+        query_params = {p.alias for p in route.dependant.query_params}
+
+        variants = [{}]
+        if "regions" in query_params and me.get("region"):
+            variants.append({"regions": me["region"]})
+        for params in variants:
+            response = await client.get(url, params=params, headers=auth)
+            print(f"GET {url} {params or ''} -> {response.status_code}")
+
+    # submit's waiting-period lookup on refusal, without taking a window
+    await last_times([(ObjectId(me["id"]), "energy")])
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--username", default="user001")
+    parser.add_argument("--password", default="seed-password")
+    args = parser.parse_args()
+
+    start = datetime.now(timezone.utc) - timedelta(seconds=1)
+    previous = await db.command("profile", 2)
+    try:
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://check"
+            ) as client:
+                await _drive_routes(client, args.username, args.password)
+    finally:
+        await db.command("profile", previous.get("was", 0))
+
+    entries = await db.system.profile.find(
+        {
+            "ts": {"$gte": start},
+            "ns": {"$regex": rf"^{db.name}\.(?!system\.)"},
+            "planSummary": {"$exists": True},
+            "command.getMore": {"$exists": False},
+        }
+    ).to_list(None)
+
+    failures = 0
+    for entry in entries:
+        command = entry.get("command", {})
+        collscan = "COLLSCAN" in entry["planSummary"]
+        failing = collscan and _has_filter(command)
+        failures += failing
+        print(
+            f"{'FAIL' if failing else 'ok  '} {entry['ns']:<32} "
+            f"{next(iter(command), '?'):<10} {entry['planSummary']:<40} "
+            f"{entry.get('millis', 0)}ms docsExamined={entry.get('docsExamined', 0)}"
+        )
+
+    if failures:
+        print(f"{failures} filtered queries fell back to COLLSCAN.")
+        sys.exit(1)
+    print(f"Checked {len(entries)} queries; no filtered COLLSCAN.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
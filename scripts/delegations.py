@@ -0,0 +1,64 @@
+"""Grant, revoke and list batch submission delegations.
+
+A delegate (e.g. an LGU office account) may submit data for the users it has
+been granted through POST /api/ghg/submit-batch. Grants are made here by an
+operator, never through the API.
+
+Usage (from the project root):
+    python -m scripts.delegations grant <delegate username> <username> [<username> ...]
+    python -m scripts.delegations revoke <delegate username> [<username> ...]   # all when none given
+    python -m scripts.delegations list <delegate username>
+"""
+
+import argparse
+import asyncio
+import sys
+
+from core import delegations
+from core.db import db
+
+
+async def user_ids(usernames) -> dict:
+    found = {
+        doc["username"]: doc["_id"]
+        async for doc in db.users.find({"username": {"$in": list(usernames)}}, {"username": 1})
+    }
+    missing = set(usernames) - found.keys()
+    if missing:
+        print(f"Unknown users: {', '.join(sorted(missing))}")
+        sys.exit(1)
+    return found
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("action", choices=["grant", "revoke", "list"])
+    parser.add_argument("delegate")
+    parser.add_argument("users", nargs="*")
+    args = parser.parse_args()
+    if args.action == "grant" and not args.users:
+        parser.error("grant needs at least one username")
+
+    ids = await user_ids([args.delegate, *args.users])
+    delegate_id = ids[args.delegate]
+    if args.action == "grant":
+        granted = await delegations.grant(delegate_id, [ids[u] for u in args.users])
+        print(f"Granted {granted} new delegations to {args.delegate}.")
+    elif args.action == "revoke":
+        users = [ids[u] for u in args.users] if args.users else None
+        revoked = await delegations.revoke(delegate_id, users)
+        print(f"Revoked {revoked} delegations of {args.delegate}.")
+    else:
+        names = {
+            doc["_id"]: doc["username"]
+            async for doc in db.users.find(
+                {"_id": {"$in": await delegations.delegated_users(delegate_id)}},
+                {"username": 1},
+            )
+        }
+        for name in sorted(names.values()):
+            print(name)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
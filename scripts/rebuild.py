@@ -0,0 +1,106 @@
+"""Regenerate derived collections from raw ghg_submissions and verify them.
+
+Usage (from the project root):
+    python -m scripts.rebuild rollups            # rebuild, then verify
+    python -m scripts.rebuild rollups --check    # verify only
+    python -m scripts.rebuild all                # every derived collection
+
+Exits with status 1 when verification finds mismatches.
+"""
+
+import argparse
+import asyncio
+import sys
+
+from core import generation, leaderboard, rollups, user_totals, windows
+
+
+async def rebuild_rollups(check_only: bool) -> bool:
+    if not check_only:
+        await rollups.rebuild()
+        print("Rebuilt ghg_rollups.")
+
+    mismatches = await rollups.verify()
+    for key, expected, actual in mismatches[:20]:
+        print(f"  mismatch {key}: expected {expected}, found {actual}")
+    if mismatches:
+        print(f"ghg_rollups: {len(mismatches)} rows differ from raw submissions.")
+        return False
+    print("ghg_rollups matches raw submissions.")
+    return True
+
+
+async def rebuild_user_totals(check_only: bool) -> bool:
+    if not check_only:
+        await user_totals.rebuild()
+        print("Rebuilt ghg_user_totals and ghg_sketches.")
+
+    mismatches = await user_totals.verify()
+    for key, expected, actual in mismatches[:20]:
+        print(f"  mismatch {key}: expected {expected}, found {actual}")
+    if mismatches:
+        print(f"ghg_user_totals/ghg_sketches: {len(mismatches)} rows differ.")
+        return False
+    print("ghg_user_totals and ghg_sketches match raw submissions.")
+    return True
+
+
+async def rebuild_leaderboard(check_only: bool) -> bool:
+    if not check_only:
+        await leaderboard.rebuild()
+        print("Rebuilt ghg_leaderboard.")
+
+    mismatches = await leaderboard.verify()
+    for key, expected, actual in mismatches[:20]:
+        print(f"  mismatch {key}: expected {expected}, found {actual}")
+    if mismatches:
+        print(f"ghg_leaderboard: {len(mismatches)} users differ.")
+        return False
+    print("ghg_leaderboard matches raw submissions and profiles.")
+    return True
+
+
+async def rebuild_windows(check_only: bool) -> bool:
+    if not check_only:
+        await windows.rebuild()
+        print("Rebuilt submission_windows.")
+
+    mismatches = await windows.verify()
+    for key, expected, actual in mismatches[:20]:
+        print(f"  mismatch {key}: expected {expected}, found {actual}")
+    if mismatches:
+        # Interpretations still in progress hold a window without a log entry
+        print(f"submission_windows: {len(mismatches)} windows differ.")
+        return False
+    print("submission_windows matches raw submissions and llm_requests.")
+    return True
+
+
+TARGETS = {
+    "rollups": rebuild_rollups,
+    "user-totals": rebuild_user_totals,
+    "leaderboard": rebuild_leaderboard,
+    "windows": rebuild_windows,
+}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("targets", nargs="+", choices=[*TARGETS, "all"])
+    parser.add_argument(
+        "--check", action="store_true", help="verify without rebuilding"
+    )
+    args = parser.parse_args()
+
+    targets = list(TARGETS) if "all" in args.targets else args.targets
+    ok = True
+    for target in targets:
+        ok = await TARGETS[target](args.check) and ok
+    if not args.check:
+        # Rebuilt data must not be answered 304 against ETags handed out before
+        await generation.bump()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,30 +1,37 @@
+"""Seed the database with users and weekly GHG submissions.
+
+Submissions are generated per chunk of users with NumPy, estimated with
+core.emissions column arithmetic and written with insert_many, several
+batches in flight at once. Derived collections are rebuilt at the end.
+
+Usage (from the project root):
+    python -m scripts.seed                                  # 200 users x 156 weeks
+    python -m scripts.seed --users 20000 --weeks 156 --seed 7 --reset
+    python -m scripts.seed --batch-size 10000 --concurrency 8
+
+Skips seeding when users already exist, unless --reset is given (which
+drops users, tokens and submissions first).
+"""
+
+import argparse
 import asyncio
-import bcrypt
-from motor.motor_asyncio import AsyncIOMotorClient
+import random
+import time
 from datetime import datetime, timedelta, timezone
-from random import randint, uniform, choice, random
+
+import numpy as np
 from bson import ObjectId
 from faker import Faker
-import os
-from dotenv import load_dotenv
 
-load_dotenv()
-
-# MongoDB URI and client setup
-MONGO_URI = os.getenv("MONGO_URI")
-client = AsyncIOMotorClient(MONGO_URI)
-db = client.ghg_scout
+from core import generation, leaderboard, rollups, user_totals, windows
+from core.db import db
+from core.emissions import NUMERIC_FIELDS, sector_co2e
+from utils.security import hash_password
 
 faker = Faker()
 COMMON_PASSWORD = "seed-password"
 
-def hash_password(password: str) -> str:
-    """Hashes a password using bcrypt."""
-    salt = bcrypt.gensalt()  # Generate a salt
-    hashed_password = bcrypt.hashpw(password.encode('utf-8'), salt)  # Hash the password with the salt
-    return hashed_password.decode('utf-8')  # Return the hashed password as a string
-
-# Password for seeding
+# Password for seeding, hashed with the configured BCRYPT_ROUNDS
 HASHED_PASSWORD = hash_password(COMMON_PASSWORD)
 
 
@@ -57,155 +64,72 @@ COMMUNITY_TYPES = [
 ]
 
 SECTORS = ["energy", "transport", "waste", "agriculture", "ippu"]
-WEEKS = 156  # Approx. 3 years
-
-# Helper function to simulate optional values (20% chance of 0)
-def maybe_zero(val, chance=0.2):
-    return 0 if random() < chance else val
-
-# Helper function to generate fake submissions per sector
-def fake_submission(sector: str) -> dict:
-    if sector == "energy":
-        return {
-            "sector": sector,
-            "electricity_consumed_kwh": maybe_zero(round(uniform(50, 400), 2)),
-            "lpg_used_kg": maybe_zero(round(uniform(0.5, 10), 2)),
-            "kerosene_used_liters": maybe_zero(round(uniform(0, 5), 2)),
-            "firewood_used_kg": maybe_zero(round(uniform(0, 15), 2)),
-            "diesel_used_liters": maybe_zero(round(uniform(0, 20), 2)),
-            "gasoline_used_liters": maybe_zero(round(uniform(0, 20), 2)),
-            "coal_used_kg": maybe_zero(round(uniform(0, 30), 2)),
-        }
-    elif sector == "transport":
-        return {
-            "sector": sector,
-            "vehicle_type": choice(["private_car", "motorcycle", "jeepney", "tricycle", "bus", "others"]),
-            "fuel_type": choice(["gasoline", "diesel", "electric", "cng", "others"]),
-            "number_of_vehicles": maybe_zero(randint(0, 10)),
-            "distance_travelled_daily_km": maybe_zero(round(uniform(2, 50), 2)),
-            "travel_frequency_per_week": maybe_zero(randint(0, 7)),
-            "trips_per_day": maybe_zero(randint(0, 4)),
-        }
-    elif sector == "waste":
-        return {
-            "sector": sector,
-            "waste_generated_kg_per_month": maybe_zero(round(uniform(10, 80), 2)),
-            "organic_fraction_percent": maybe_zero(round(uniform(20, 70), 2)),
-            "waste_disposal_method": choice(["landfill", "recycling", "composting", "incineration", "open_dumping", "others"]),
-            "methane_capture": choice([True, False]),
-        }
-    elif sector == "agriculture":
-        return {
-            "sector": sector,
-            "number_of_cattle": maybe_zero(randint(0, 10)),
-            "number_of_carabao": maybe_zero(randint(0, 5)),
-            "number_of_goats": maybe_zero(randint(0, 10)),
-            "number_of_pigs": maybe_zero(randint(0, 8)),
-            "number_of_chickens": maybe_zero(randint(0, 50)),
-            "manure_management": choice(["dry_lot", "pasture", "lagoon", "composting", "none"]),
-            "rice_paddy_area_hectares": maybe_zero(round(uniform(0, 3), 2)),
-            "rice_water_management": choice(["continuous_flooding", "intermittent_flooding", "dry_cultivation"]),
-            "fertilizer_type": choice(["synthetic", "organic", "none"]),
-            "fertilizer_applied_kg": maybe_zero(round(uniform(0, 20), 2)),
-        }
-    elif sector == "ippu":
-        return {
-            "sector": sector,
-            "cement_produced_tonnes": maybe_zero(round(uniform(0, 50), 2)),
-            "lime_produced_tonnes": maybe_zero(round(uniform(0, 10), 2)),
-            "steel_produced_tonnes": maybe_zero(round(uniform(0, 20), 2)),
-            "refrigerant_consumed_kg": maybe_zero(round(uniform(0, 10), 2)),
-            "solvent_used_liters": maybe_zero(round(uniform(0, 100), 2)),
-            "other_process_emissions_CO2e_tonnes": maybe_zero(round(uniform(0, 5), 2)),
-        }
-
-def estimate_emissions(data: dict) -> float:
-    sector = data.get("sector")
-    ef = {
-        "electricity": 0.709,
-        "lpg": 2.983,
-        "kerosene": 2.391,
-        "firewood": 0.015,
-        "diesel": 2.68,
-        "gasoline": 2.32,
-        "coal": 2.42,
-        "cng": 2.0,
-        "others": 2.0
-    }
-
-    co2e = 0.0
-
-    if sector == "energy":
-        co2e += data.get("electricity_consumed_kwh", 0) * ef["electricity"]
-        co2e += data.get("lpg_used_kg", 0) * ef["lpg"]
-        co2e += data.get("kerosene_used_liters", 0) * ef["kerosene"]
-        co2e += data.get("firewood_used_kg", 0) * ef["firewood"]
-        co2e += data.get("diesel_used_liters", 0) * ef["diesel"]
-        co2e += data.get("gasoline_used_liters", 0) * ef["gasoline"]
-        co2e += data.get("coal_used_kg", 0) * ef["coal"]
-
-    elif sector == "transport":
-        vehicles = data.get("number_of_vehicles", 0)
-        distance = data.get("distance_travelled_daily_km", 0)
-        freq = data.get("travel_frequency_per_week", 0)
-        trips = data.get("trips_per_day", 0)
-        fuel_type = data.get("fuel_type", "diesel").lower()
-        fuel_ef = ef.get(fuel_type, 2.0)
-        co2e = vehicles * distance * freq * trips * fuel_ef
-
-    elif sector == "waste":
-        waste = data.get("waste_generated_kg_per_month", 0)
-        organic = data.get("organic_fraction_percent", 0)
-        method = data.get("waste_disposal_method", "landfill")
-        methane_capture = data.get("methane_capture", False)
-        waste_ef = {
-            "landfill": 1.8,
-            "open_dumping": 2.0,
-            "composting": 0.2,
-            "recycling": 0.0,
-            "incineration": 2.0,
-            "others": 1.0
-        }
-        base_ef = waste_ef.get(method, 1.0)
-        if methane_capture and method == "landfill":
-            base_ef *= 0.5
-        co2e = waste * (organic / 100.0) * base_ef
-
-    elif sector == "agriculture":
-        co2e = (
-            data.get("number_of_cattle", 0) * 912.5 +
-            data.get("number_of_carabao", 0) * 730 +
-            data.get("number_of_goats", 0) * 182.5 +
-            data.get("number_of_pigs", 0) * 401.5 +
-            data.get("number_of_chickens", 0) * 7.3 +
-            data.get("fertilizer_applied_kg", 0) * 5.5
-        )
-        if data.get("rice_paddy_area_hectares", 0) > 0:
-            rice_ef = {
-                "continuous_flooding": 1200,
-                "intermittent_flooding": 800,
-                "dry_cultivation": 100
-            }
-            water_mgmt = data.get("rice_water_management", "continuous_flooding")
-            co2e += data["rice_paddy_area_hectares"] * rice_ef.get(water_mgmt, 1200)
-
-    elif sector == "ippu":
-        co2e = (
-            data.get("cement_produced_tonnes", 0) * 800 +
-            data.get("lime_produced_tonnes", 0) * 900 +
-            data.get("steel_produced_tonnes", 0) * 1800 +
-            data.get("refrigerant_consumed_kg", 0) * 1430 +
-            data.get("solvent_used_liters", 0) * 2.0 +
-            data.get("other_process_emissions_CO2e_tonnes", 0) * 1000
-        )
-
-    return round(co2e, 2)
-
-async def seed_users(n=200):
-    if await db.users.count_documents({}) > 0:
-        print("Users already seeded. Skipping.")
-        return []
 
+ZERO_CHANCE = 0.2  # chance of any numeric field being 0
+SUBMIT_CHANCE = 0.8  # chance of a user submitting in a given week
+
+# Numeric fields per sector: (field, low, high, integer)
+NUMERIC_SPECS = {
+    "energy": [
+        ("electricity_consumed_kwh", 50, 400, False),
+        ("lpg_used_kg", 0.5, 10, False),
+        ("kerosene_used_liters", 0, 5, False),
+        ("firewood_used_kg", 0, 15, False),
+        ("diesel_used_liters", 0, 20, False),
+        ("gasoline_used_liters", 0, 20, False),
+        ("coal_used_kg", 0, 30, False),
+    ],
+    "transport": [
+        ("number_of_vehicles", 0, 10, True),
+        ("distance_travelled_daily_km", 2, 50, False),
+        ("travel_frequency_per_week", 0, 7, True),
+        ("trips_per_day", 0, 4, True),
+    ],
+    "waste": [
+        ("waste_generated_kg_per_month", 10, 80, False),
+        ("organic_fraction_percent", 20, 70, False),
+    ],
+    "agriculture": [
+        ("number_of_cattle", 0, 10, True),
+        ("number_of_carabao", 0, 5, True),
+        ("number_of_goats", 0, 10, True),
+        ("number_of_pigs", 0, 8, True),
+        ("number_of_chickens", 0, 50, True),
+        ("rice_paddy_area_hectares", 0, 3, False),
+        ("fertilizer_applied_kg", 0, 20, False),
+    ],
+    "ippu": [
+        ("cement_produced_tonnes", 0, 50, False),
+        ("lime_produced_tonnes", 0, 10, False),
+        ("steel_produced_tonnes", 0, 20, False),
+        ("refrigerant_consumed_kg", 0, 10, False),
+        ("solvent_used_liters", 0, 100, False),
+        ("other_process_emissions_CO2e_tonnes", 0, 5, False),
+    ],
+}
+
+# Categorical fields per sector and the values drawn from
+CATEGORICAL_SPECS = {
+    "energy": {},
+    "transport": {
+        "vehicle_type": ["private_car", "motorcycle", "jeepney", "tricycle", "bus", "others"],
+        "fuel_type": ["gasoline", "diesel", "electric", "cng", "others"],
+    },
+    "waste": {
+        "waste_disposal_method": ["landfill", "recycling", "composting", "incineration", "open_dumping", "others"],
+        "methane_capture": [True, False],
+    },
+    "agriculture": {
+        "manure_management": ["dry_lot", "pasture", "lagoon", "composting", "none"],
+        "rice_water_management": ["continuous_flooding", "intermittent_flooding", "dry_cultivation"],
+        "fertilizer_type": ["synthetic", "organic", "none"],
+    },
+    "ippu": {},
+}
+
+
+def fake_users(n: int, rnd: random.Random) -> list:
+    """n user documents spread evenly over the regions, with client-side _ids."""
     users = []
     used_communities = set()
     now = datetime.now(timezone.utc)
@@ -214,12 +138,11 @@ async def seed_users(n=200):
     users_per_region = n // regions_count
     extra = n % regions_count
 
-    user_id = 1
     for idx, (region, cities) in enumerate(REGIONS_AND_CITIES):
         count = users_per_region + (1 if idx < extra else 0)
         for _ in range(count):
-            city = choice(cities)
-            community_type = choice(COMMUNITY_TYPES)
+            city = rnd.choice(cities)
+            community_type = rnd.choice(COMMUNITY_TYPES)
             if community_type == "School":
                 community = f"{faker.company()} School"
             elif community_type == "College/University":
@@ -227,52 +150,176 @@ async def seed_users(n=200):
             else:
                 community = f"{city} {community_type}"
 
-            if community in used_communities:
-                continue
+            # Community names stay unique however many users are generated
+            unique, suffix = community, 2
+            while unique in used_communities:
+                unique, suffix = f"{community} {suffix}", suffix + 1
+            used_communities.add(unique)
 
-            used_communities.add(community)
-            user = {
-                "username": f"user{user_id:03d}",
+            users.append({
+                "_id": ObjectId(),
+                "username": f"user{len(users) + 1:03d}",
                 "password": HASHED_PASSWORD,
                 "community_type": community_type,
-                "community_name": community,
+                "community_name": unique,
                 "region": region,
                 "city": city,
                 "created_at": now,
                 "updated_at": now
-            }
-            result = await db.users.insert_one(user)
-            users.append(result.inserted_id)
-            user_id += 1
-
-    print(f"Seeded {len(users)} users.")
+            })
     return users
 
-async def seed_ghg_data_for_user(user_id: ObjectId, start_date: datetime, total_weeks: int):
-    current_date = start_date
-    for _ in range(total_weeks):
-        if random() > 0.2:
-            sector = choice(SECTORS)
-            submission_data = fake_submission(sector)
-            submission_data.update({
-                "user_id": user_id,
-                "created_at": current_date,
-                "updated_at": current_date,
-                "estimated_co2e_kg": estimate_emissions(submission_data)
+
+def fake_sector_columns(sector: str, n: int, rng: np.random.Generator) -> dict:
+    """n random submissions of one sector as columns: float64 arrays for
+    numeric fields (integers where the model has ints) and lists of values
+    for categorical ones."""
+    columns = {}
+    for field, low, high, integer in NUMERIC_SPECS[sector]:
+        if integer:
+            values = rng.integers(low, high, size=n, endpoint=True).astype(np.float64)
+        else:
+            values = np.round(rng.uniform(low, high, size=n), 2)
+        values[rng.random(n) < ZERO_CHANCE] = 0
+        columns[field] = values
+    for field, choices in CATEGORICAL_SPECS[sector].items():
+        columns[field] = [choices[i] for i in rng.integers(0, len(choices), size=n)]
+    return columns
+
+
+def fake_submissions(users: list, dates: list, rng: np.random.Generator) -> list:
+    """Weekly submissions of a chunk of users, in random sectors, with CO2e
+    estimated per sector in one pass."""
+    submitted = rng.random((len(users), len(dates))) < SUBMIT_CHANCE
+    user_idx, week_idx = np.nonzero(submitted)
+    sectors = rng.integers(0, len(SECTORS), size=len(user_idx))
+
+    docs = []
+    for s, sector in enumerate(SECTORS):
+        rows = np.flatnonzero(sectors == s)
+        if not len(rows):
+            continue
+        columns = fake_sector_columns(sector, len(rows), rng)
+        co2e = [round(value, 2) for value in sector_co2e(sector, columns).tolist()]
+
+        integer_fields = {field for field, _, _, integer in NUMERIC_SPECS[sector] if integer}
+        fields = list(NUMERIC_FIELDS[sector]) + list(CATEGORICAL_SPECS[sector])
+        values = []
+        for field in fields:
+            column = columns[field]
+            if field in integer_fields:
+                column = [int(v) for v in column.tolist()]
+            elif isinstance(column, np.ndarray):
+                column = column.tolist()
+            values.append(column)
+
+        for u, w, estimate, *row in zip(
+            user_idx[rows].tolist(), week_idx[rows].tolist(), co2e, *values
+        ):
+            user = users[u]
+            doc = {"sector": sector, **dict(zip(fields, row))}
+            doc.update({
+                "user_id": user["_id"],
+                "region": user.get("region"),
+                "city": user.get("city"),
+                "community_type": user.get("community_type"),
+                "created_at": dates[w],
+                "updated_at": dates[w],
+                "estimated_co2e_kg": estimate,
             })
-            await db.ghg_submissions.insert_one(submission_data)
-        current_date += timedelta(weeks=1)
+            docs.append(doc)
+    return docs
+
+
+async def insert_batches(collection, batches, concurrency: int) -> int:
+    """insert_many every batch yielded by `batches`, at most `concurrency` at
+    a time. Batches are generated while earlier ones are being written."""
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = []
+    inserted = 0
+
+    async def insert(batch):
+        try:
+            await collection.insert_many(batch, ordered=False)
+        finally:
+            semaphore.release()
+
+    for batch in batches:
+        await semaphore.acquire()
+        tasks.append(asyncio.create_task(insert(batch)))
+        inserted += len(batch)
+        await asyncio.sleep(0)  # let the new insert start before generating more
+    await asyncio.gather(*tasks)
+    return inserted
+
+
+def chunks(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def submission_batches(users, dates, rng, batch_size: int):
+    users_per_chunk = max(1, batch_size // max(len(dates), 1))
+    pending = []
+    for chunk in chunks(users, users_per_chunk):
+        pending.extend(fake_submissions(chunk, dates, rng))
+        while len(pending) >= batch_size:
+            yield pending[:batch_size]
+            pending = pending[batch_size:]
+    if pending:
+        yield pending
+
+
+async def seed(args):
+    if args.reset:
+        for name in ("users", "tokens", "ghg_submissions"):
+            await db[name].drop()
+    elif await db.users.count_documents({}) > 0:
+        print("Users already seeded. Skipping.")
+        return
+
+    rnd = random.Random(args.seed)
+    faker.seed_instance(args.seed)
+    rng = np.random.default_rng(args.seed)
+
+    started = time.perf_counter()
+    users = fake_users(args.users, rnd)
+    await insert_batches(db.users, chunks(users, args.batch_size), args.concurrency)
+    print(f"Seeded {len(users)} users.")
+
+    start_date = datetime.fromisoformat(args.start_date)
+    dates = [start_date + timedelta(weeks=week) for week in range(args.weeks)]
+    count = await insert_batches(
+        db.ghg_submissions,
+        submission_batches(users, dates, rng, args.batch_size),
+        args.concurrency,
+    )
+    elapsed = time.perf_counter() - started
+    print(
+        f"Seeded {count} GHG submissions in {elapsed:.1f}s "
+        f"({count / max(elapsed, 1e-9):,.0f}/s)."
+    )
+
+    await rollups.rebuild()
+    await user_totals.rebuild()
+    await leaderboard.rebuild()
+    await windows.rebuild()
+    print("Rollups, user totals, sketches, leaderboard and submission windows rebuilt.")
+    # Reseeded data must not be answered 304 against ETags handed out before
+    await generation.bump()
+
 
-async def seed_ghg_data_for_all_users():
-    users = await db.users.find().to_list(None)
-    start_date = datetime(2022, 1, 1)
-    for user in users:
-        await seed_ghg_data_for_user(user["_id"], start_date, WEEKS)
-    print("GHG Data Seeding Complete.")
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--weeks", type=int, default=156)  # Approx. 3 years
+    parser.add_argument("--seed", type=int, default=None, help="RNG seed for reproducible data")
+    parser.add_argument("--start-date", default="2022-01-01")
+    parser.add_argument("--batch-size", type=int, default=5000, help="documents per insert_many")
+    parser.add_argument("--concurrency", type=int, default=4, help="insert_many calls in flight")
+    parser.add_argument("--reset", action="store_true", help="drop existing users, tokens and submissions first")
+    asyncio.run(seed(parser.parse_args()))
 
-async def main():
-    await seed_users(200)
-    await seed_ghg_data_for_all_users()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    main()
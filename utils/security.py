@@ -1,9 +1,37 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import bcrypt
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+load_dotenv()
+
+# bcrypt is deliberately slow (tens to hundreds of ms per call) and would
+# stall every request on the worker if run on the event loop. The async
+# variants below run it on a small dedicated thread pool (bcrypt releases
+# the GIL while hashing):
+#   BCRYPT_ROUNDS         cost factor of new hashes; existing hashes keep
+#                         the cost they were created with
+#   PASSWORD_WORKERS      hashing threads, 0 to hash on the event loop
+#   PASSWORD_QUEUE_LIMIT  hashes running or waiting before register and
+#                         login answer 503
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", "64"))
+
+_executor = (
+    ThreadPoolExecutor(max_workers=PASSWORD_WORKERS, thread_name_prefix="bcrypt")
+    if PASSWORD_WORKERS
+    else None
+)
+_in_flight = 0
 
 
 # Hash password using bcrypt
 def hash_password(password: str) -> str:
-    salt = bcrypt.gensalt()  # Generate a salt for bcrypt
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)  # Generate a salt for bcrypt
     hashed = bcrypt.hashpw(
         password.encode("utf-8"), salt
     )  # Hash the password with the salt
@@ -13,3 +41,37 @@ def hash_password(password: str) -> str:
 # Verify if the password matches the hashed password
 def verify_password(raw_password: str, hashed: str) -> bool:
     return bcrypt.checkpw(raw_password.encode("utf-8"), hashed.encode("utf-8"))
+
+
+async def _offload(func, *args):
+    global _in_flight
+    if _executor is None:
+        return func(*args)
+    if _in_flight >= PASSWORD_QUEUE_LIMIT:
+        raise HTTPException(
+            status_code=503,
+            detail="Server busy, please try again shortly",
+            headers={"Retry-After": "1"},
+        )
+    _in_flight += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+    finally:
+        _in_flight -= 1
+
+
+async def hash_password_async(password: str) -> str:
+    return await _offload(hash_password, password)
+
+
+async def verify_password_async(raw_password: str, hashed: str) -> bool:
+    return await _offload(verify_password, raw_password, hashed)
+
+
+def stats() -> dict:
+    return {
+        "rounds": BCRYPT_ROUNDS,
+        "workers": PASSWORD_WORKERS,
+        "in_flight": _in_flight,
+        "queue_limit": PASSWORD_QUEUE_LIMIT,
+    }